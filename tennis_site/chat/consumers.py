@@ -1,14 +1,23 @@
-import json
+import asyncio
+import uuid
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 
-from .models import Chat, Message
+from players.models import Player
+
+from .models import Message
+from . import metrics, notifications, presence, serializers, services, throttle, wire, writebehind
+
 
+class ChatConsumer(wire.WireProtocolMixin, AsyncWebsocketConsumer):
+    sender = None  # Player отправителя, загружается при первом сообщении
 
-class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.chat_id = self.scope["url_route"]["kwargs"]["chat_id"]
+        self.chat_id = int(self.scope["url_route"]["kwargs"]["chat_id"])
         self.room_group_name = f"chat_{self.chat_id}"
 
         user = self.scope.get("user")
@@ -23,103 +32,246 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return
 
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        await self.accept_negotiated()
+
+        # лимиты входящих кадров этого соединения
+        self.frames = throttle.frame_bucket()
+        self.dropped = 0
+
+        # присутствие: собеседникам — только при переходе offline -> online
+        self.user_id = user.id
+        if await presence.aconnect(user.id):
+            await self.channel_layer.group_send(self.room_group_name, await presence.apresence_event(user.id))
+        for uid in await self._other_user_ids(self.chat_id, user.id):
+            await self.send_event("presence", {"type": "presence", **await presence.astatus(uid)})
+
+        # переподключение: ?last_seen_id=<id> — досылаем только пропущенное
+        self.replayed_up_to = 0
+        last_seen_id = self._last_seen_id()
+        if last_seen_id is not None:
+            await self._replay(last_seen_id)
+
+    def _last_seen_id(self):
+        values = parse_qs(self.scope.get("query_string", b"").decode()).get("last_seen_id")
+        if values and values[0].isdigit():
+            return int(values[0])
+        return None
+
+    async def _replay(self, last_seen_id):
+        """
+        Сообщения новее last_seen_id — до CHAT_REPLAY_MAX штук. Если пропущено больше,
+        клиент получает ``resync`` и должен перезагрузить историю целиком.
+        С CHAT_WRITE_BEHIND живые сообщения приходят без id, так что клиенту
+        нечего передать в last_seen_id — досылка в этом режиме не работает.
+        Группа уже подключена, поэтому живые сообщения, попавшие и в выборку,
+        отбрасываются в chat_message по replayed_up_to.
+        """
+        limit = getattr(settings, "CHAT_REPLAY_MAX", 200)
+        rows, more = await self._missed_messages(last_seen_id, limit)
+        metrics.incr("ws.replay")
+        if more:
+            metrics.incr("ws.replay_resync")
+            await self.send_event("resync", {"type": "resync"})
+            return
+        for row in rows:
+            await self.send_event("message", {
+                "id": row["id"],
+                "message": row["text"],
+                "sender": row["sender_name"],
+                "sender_photo": row["sender_photo"],
+                "created_at": row["created_at"],
+            })
+        self.replayed_up_to = rows[-1]["id"] if rows else last_seen_id
+        metrics.incr("ws.replay_messages", len(rows))
+        await self.send_event("resumed", {"type": "resumed", "replayed": len(rows), "last_id": self.replayed_up_to})
 
     async def disconnect(self, close_code):
+        if getattr(self, "user_id", None) is None:
+            return  # соединение не было принято
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if await presence.adisconnect(self.user_id):
+            await self.channel_layer.group_send(self.room_group_name, await presence.apresence_event(self.user_id))
+        if writebehind.enabled():
+            await writebehind.get_buffer().flush()
 
-    async def receive(self, text_data):
-        data = json.loads(text_data or "{}")
-        message = (data.get("message") or "").strip()
+    async def receive(self, text_data=None, bytes_data=None):
+        if not self.frames.consume():
+            await self._drop_frame()
+            return
+        size = len(bytes_data) if bytes_data is not None else len((text_data or "").encode())
+        if size > throttle.max_frame_bytes():
+            metrics.incr("ws.frame_too_big_closed")
+            await self.close(code=throttle.CLOSE_TOO_BIG)
+            return
+        try:
+            data = wire.decode_frame(text_data, bytes_data)
+        except ValueError:
+            metrics.incr("ws.bad_frame")
+            return
+
+        # служебные кадры: без БД, только кэш
+        kind = data.get("type")
+        if kind == "ping":
+            await presence.aheartbeat(self.user_id)
+            return
+        if kind == "typing":
+            if await presence.atyping_allowed(self.chat_id, self.user_id):
+                await self.channel_layer.group_send(self.room_group_name, presence.typing_event(self.user_id))
+            return
+
+        message = str(data.get("message") or "").strip()
         if not message:
             return
+        if len(message) > throttle.max_message_length():
+            metrics.incr("throttle.too_long")
+            await self.send_event("error", {"type": "error", "error": "too_long"})
+            return
+        if not throttle.allow_user_message(self.user_id):
+            await self.send_event("error", {"type": "error", "error": "rate_limited"})
+            return
 
-        user = self.scope["user"]
-        saved_message = await self._save_message(user.id, self.chat_id, message)
-
-        # шлём в комнату
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "chat_message",
-                "message": saved_message["text"],
-                "sender": saved_message["sender_name"],
-                "sender_photo": saved_message["sender_photo"],
-                "created_at": saved_message["created_at"],
-                "mine_user_id": user.id,
-            }
-        )
-
-        # нотификации (опционально — по группам пользователей)
-        others = await self._other_user_ids(self.chat_id, user.id)
-        for uid in others:
-            await self.channel_layer.group_send(
-                f"user_{uid}",
-                {
-                    "type": "notify",
-                    "unread_count": await self._get_unread_count(uid),
-                }
-            )
+        if writebehind.enabled():
+            await self._receive_write_behind(message)
+            return
+
+        # сохранение + рассылка в chat_{id} и user_{id} — как у api_send, но за один
+        # переход в поток БД: всё нужное для рассылки возвращает _post_message
+        metrics.incr("ws.db_hops")
+        msg, recipients = await self._post_message(message)
+        await services.apublish_message(msg, self.sender, recipients)
+
+    async def _drop_frame(self):
+        """Кадр сверх лимита соединения; при систематическом превышении — отключаем."""
+        self.dropped += 1
+        metrics.incr("throttle.frame_dropped")
+        if self.dropped == getattr(settings, "CHAT_WS_RATE_DROP_LIMIT", 20):
+            metrics.incr("ws.rate_limit_closed")
+            await self.close(code=throttle.CLOSE_RATE_LIMITED)
+
+    async def _receive_write_behind(self, text):
+        """Рассылаем сразу, в БД — пачкой; уведомления уйдут после сброса буфера."""
+        if self.sender is None:
+            metrics.incr("ws.db_hops")
+            self.sender = await database_sync_to_async(self._load_sender)()
+        msg = Message(chat_id=self.chat_id, sender=self.sender, text=text)
+        event = services.message_event(msg, self.sender)
+        event["temp_id"] = uuid.uuid4().hex  # id появится только после сброса буфера
+        await self.channel_layer.group_send(self.room_group_name, event)
+        await writebehind.get_buffer().add(msg)
 
     async def chat_message(self, event):
+        # уже отправлено при replay после переподключения
+        if event.get("id") is not None and event["id"] <= self.replayed_up_to:
+            return
         # клиентский JS может сравнить user.id, если его туда передавать.
-        await self.send(text_data=json.dumps({
+        payload = {
+            "id": event.get("id"),
             "message": event["message"],
             "sender": event["sender"],
             "sender_photo": event["sender_photo"],
             "created_at": event["created_at"],
-        }))
+        }
+        if event.get("temp_id"):
+            payload["temp_id"] = event["temp_id"]  # write-behind: id ещё нет
+        await self.send_event("message", payload)
+
+    async def chat_typing(self, event):
+        if event["user_id"] != self.user_id:  # свои вкладки не показывают «печатает…»
+            await self.send_event("typing", {"type": "typing", "user_id": event["user_id"]})
+
+    async def chat_presence(self, event):
+        if event["user_id"] != self.user_id:
+            await self.send_event("presence", {
+                "type": "presence",
+                "user_id": event["user_id"],
+                "online": event["online"],
+                "last_seen": event["last_seen"],
+            })
 
     @database_sync_to_async
     def _is_participant(self, user_id, chat_id):
-        return Chat.objects.filter(id=chat_id, participants__user__id=user_id).exists()
+        return services.is_member(chat_id, user_id)
 
     @database_sync_to_async
-    def _save_message(self, user_id, chat_id, text):
-        chat = Chat.objects.get(id=chat_id)
-        sender = chat.participants.select_related("user").get(user__id=user_id)
-        msg = Message.objects.create(chat=chat, sender=sender, text=text)
-        photo = sender.photo.url if getattr(sender, "photo", None) and sender.photo else None
-        return {
-            "id": msg.id,
-            "text": msg.text,
-            "sender_name": sender.first_name,
-            "sender_photo": photo,
-            "created_at": msg.created_at.isoformat(),
-        }
+    def _post_message(self, text):
+        """Отправитель (при первом сообщении), INSERT и получатели — одним переходом."""
+        if self.sender is None:
+            self.sender = self._load_sender()
+        msg = services.post_message(self.chat_id, self.sender.id, text, broadcast=False)
+        return msg, services.other_member_user_ids(self.chat_id, self.sender.user_id)
 
     @database_sync_to_async
-    def _other_user_ids(self, chat_id, me_user_id):
-        return list(
-            Chat.objects.get(id=chat_id)
-            .participants.exclude(user__id=me_user_id)
-            .values_list("user__id", flat=True)
-        )
+    def _missed_messages(self, last_seen_id, limit):
+        # окна message_window ограничены CHAT_MAX_PAGE_SIZE — идём по ним до limit
+        rows, more, cursor = [], True, last_seen_id
+        while more and len(rows) <= limit:
+            window, more = services.message_window(self.chat_id, after=cursor, limit=limit, as_values=True)
+            if not window:
+                break
+            rows += window
+            cursor = window[-1]["id"]
+        if len(rows) > limit:
+            return [], True
+        return serializers.serialize_messages(rows, None), False
+
+    def _load_sender(self):
+        # player_id кладёт CachedAuthMiddleware; членство уже проверено в connect
+        player_id = self.scope.get("player_id") or services.member_player_id(self.chat_id, self.scope["user"].id)
+        return Player.objects.get(id=player_id)
 
     @database_sync_to_async
-    def _get_unread_count(self, user_id):
-        return (
-            Message.objects
-            .filter(chat__participants__user__id=user_id, is_read=False)
-            .exclude(sender__user__id=user_id)
-            .count()
-        )
+    def _other_user_ids(self, chat_id, me_user_id):
+        return services.other_member_user_ids(chat_id, me_user_id)
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(wire.WireProtocolMixin, AsyncWebsocketConsumer):
     async def connect(self):
         user = self.scope.get("user")
         if not user.is_authenticated:
             await self.close()
             return
+        self.user_id = user.id
         self.group_name = f"user_{user.id}"
+        self.batch = notifications.NotifyBatch()
+        self._batch_timer = None
         await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        await self.accept_negotiated()
+        await presence.aconnect(user.id)
 
     async def disconnect(self, close_code):
+        if getattr(self, "user_id", None) is None:
+            return
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await presence.adisconnect(self.user_id)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # единственный входящий кадр — heartbeat присутствия
+        if len(text_data or bytes_data or "") > 256:
+            return
+        try:
+            if wire.decode_frame(text_data, bytes_data).get("type") == "ping":
+                await presence.aheartbeat(self.user_id)
+        except ValueError:
+            metrics.incr("ws.bad_frame")
 
     async def notify(self, event):
-        await self.send(text_data=json.dumps({
-            "unread_count": event["unread_count"]
-        }))
+        """Копим события notify в течение окна debounce и отдаём одним кадром."""
+        self.batch.add(event)
+        if self._batch_timer is None:
+            self._batch_timer = asyncio.get_running_loop().call_later(
+                notifications.debounce_window(), lambda: asyncio.ensure_future(self.flush_notifications())
+            )
+
+    async def flush_notifications(self):
+        self._batch_timer = None
+        batch, self.batch = self.batch, notifications.NotifyBatch()
+        if not batch:
+            return
+        count = await self._get_unread_count(self.user_id) if batch.unread else None
+        await self.send_event("notify", batch.payload(count))
+
+    @database_sync_to_async
+    def _get_unread_count(self, user_id):
+        return services.unread_total(user_id)
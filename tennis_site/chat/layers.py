@@ -0,0 +1,86 @@
+"""
+Channel layer'ы чата с метриками backpressure.
+
+* ``RedisChannelLayer`` — продакшн: шардирование по нескольким Redis-хостам,
+  общий для всех воркеров (сообщения не теряются между процессами).
+* ``InMemoryChannelLayer`` — локальная замена для тестов и разработки
+  (работает только внутри одного процесса).
+
+Оба слоя считают отправки и переполнения канала в ``chat.metrics``:
+``layer.channel_full`` — ChannelFull из send (и из group_send in-memory слоя),
+``layer.group_over_capacity`` — каналы, пропущенные group_send Redis-слоя.
+channels_redis в group_send исключение не бросает: переполнение считается в
+Lua-скрипте и только пишется в лог (INFO «… over capacity in group …»),
+поэтому эти записи перехватывает фильтр логгера ``channels_redis.core``.
+"""
+import logging
+
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer as _InMemoryChannelLayer
+
+from . import metrics
+
+# формат сообщения channels_redis.core.RedisChannelLayer.group_send
+OVER_CAPACITY_MSG = "%s of %s channels over capacity in group %s"
+
+
+class MeteredLayerMixin:
+    """Считает send/group_send и переполнения очередей каналов."""
+
+    async def send(self, channel, message):
+        metrics.incr("layer.send")
+        try:
+            return await super().send(channel, message)
+        except ChannelFull:
+            metrics.incr("layer.channel_full")
+            raise
+
+    async def group_send(self, group, message):
+        metrics.incr("layer.group_send")
+        return await super().group_send(group, message)
+
+
+class InMemoryChannelLayer(MeteredLayerMixin, _InMemoryChannelLayer):
+    """In-process слой: group_send внутри вызывает send, поэтому ChannelFull считается."""
+
+
+class OverCapacityFilter(logging.Filter):
+    """
+    Считает записи channels_redis о переполнении в group_send. Чтобы они вообще
+    создавались, логгеру ставится уровень INFO; остальные записи ниже прежнего
+    уровня (``threshold``) фильтр отбрасывает, так что вывод логов не меняется.
+    """
+
+    def __init__(self, threshold):
+        super().__init__()
+        self.threshold = threshold
+
+    def filter(self, record):
+        if record.msg == OVER_CAPACITY_MSG and record.args:
+            metrics.incr("layer.group_over_capacity", record.args[0])
+        return record.levelno >= self.threshold
+
+
+def install_over_capacity_filter(logger_name="channels_redis.core"):
+    logger = logging.getLogger(logger_name)
+    if any(isinstance(f, OverCapacityFilter) for f in logger.filters):
+        return
+    threshold = logger.getEffectiveLevel()
+    if threshold > logging.INFO:
+        logger.setLevel(logging.INFO)
+    logger.addFilter(OverCapacityFilter(threshold))
+
+
+try:
+    from channels_redis.core import RedisChannelLayer as _RedisChannelLayer
+except ImportError:  # channels_redis не установлен — доступен только in-memory слой
+    _RedisChannelLayer = None
+
+if _RedisChannelLayer is not None:
+
+    class RedisChannelLayer(MeteredLayerMixin, _RedisChannelLayer):
+        """Redis-слой; переполнения в group_send считаются по логу channels_redis."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            install_over_capacity_filter()
@@ -0,0 +1,68 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from chat import metrics
+from chat.models import ArchivedMessage, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит сообщения старше --days дней из chat_message в архив (ArchivedMessage) "
+        "небольшими транзакциями. Последнее сообщение каждого чата остаётся живым — "
+        "для превью в списке чатов. Запускать по расписанию (cron), например раз в сутки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=getattr(settings, "CHAT_ARCHIVE_AFTER_DAYS", 180))
+        parser.add_argument("--batch", type=int, default=getattr(settings, "CHAT_ARCHIVE_BATCH", 500))
+        parser.add_argument("--sleep", type=float, default=0.05,
+                            help="пауза между пачками (сек.), чтобы не держать блокировку записи SQLite")
+        parser.add_argument("--limit", type=int, default=0, help="максимум сообщений за запуск (0 — без ограничения)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(days=opts["days"])
+        newer_in_chat = Message.objects.filter(chat_id=OuterRef("chat_id"), id__gt=OuterRef("id"))
+        candidates = (
+            Message.objects
+            .filter(created_at__lt=cutoff)
+            .filter(Exists(newer_in_chat))
+            .order_by("id")
+        )
+
+        if opts["dry_run"]:
+            self.stdout.write(f"К архивации: {candidates.count()} сообщений старше {cutoff:%Y-%m-%d}")
+            return
+
+        moved = 0
+        while not opts["limit"] or moved < opts["limit"]:
+            size = opts["batch"]
+            if opts["limit"]:
+                size = min(size, opts["limit"] - moved)
+            n = self._archive_batch(candidates, size)
+            if not n:
+                break
+            moved += n
+            metrics.incr("archive.messages", n)
+            time.sleep(opts["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"В архив перенесено сообщений: {moved}"))
+
+    def _archive_batch(self, candidates, size):
+        """Одна пачка: копия в архив + удаление в одной короткой транзакции."""
+        with transaction.atomic():
+            batch = list(candidates.values("id", "chat_id", "sender_id", "text", "created_at")[:size])
+            if not batch:
+                return 0
+            ArchivedMessage.objects.bulk_create(
+                [ArchivedMessage(**row) for row in batch],
+                ignore_conflicts=True,  # повторный запуск после сбоя
+            )
+            Message.objects.filter(id__in=[row["id"] for row in batch]).delete()
+        return len(batch)
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+class QueryCounter:
+    """Считает SQL-запросы во всех потоках (database_sync_to_async ходит в БД из пула)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        for conn in connections.all(initialized_only=True):
+            conn.execute_wrappers.append(self)
+        connection_created.connect(self._on_connect, weak=False)
+
+    def _on_connect(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return round(values[k] * 1000, 2)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _session_cookie(user):
+    """Сессия вошедшего пользователя (как после login) -> заголовок Cookie."""
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return (b"cookie", f"{settings.SESSION_COOKIE_NAME}={session.session_key}".encode())
+
+
+def _handshake_ms(before, after):
+    """Среднее время ws.handshake_auth между двумя снимками метрик."""
+    count = after.get("ws.handshake_auth.count", 0) - before.get("ws.handshake_auth.count", 0)
+    total = after.get("ws.handshake_auth.total_us", 0) - before.get("ws.handshake_auth.total_us", 0)
+    return round(total / count / 1000, 3) if count else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест чата на временной тестовой БД: N участников в M чатах подключаются "
+        "к ChatConsumer и NotificationConsumer и шлют сообщения. Печатает сообщения/сек., "
+        "задержку доставки p50/p95/p99, SQL-запросов и переходов в поток БД на сообщение; "
+        "результат сохраняется в JSON с именем по git-коммиту."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20, help="участников всего")
+        parser.add_argument("--chats", type=int, default=10, help="чатов (участники распределяются по кругу)")
+        parser.add_argument("--messages", type=int, default=20, help="сообщений от каждого участника")
+        parser.add_argument("--interval", type=float, default=0.0, help="пауза между сообщениями участника (сек.)")
+        parser.add_argument("--timeout", type=float, default=60.0, help="сколько ждать доставки (сек.)")
+        parser.add_argument("--output", default=str(Path(settings.BASE_DIR) / "loadtest_results"),
+                            help="каталог для JSON с результатами (по умолчанию в .gitignore)")
+        parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+        parser.add_argument("--respect-limits", action="store_true",
+                            help="не отключать rate limit чата (chat/throttle.py)")
+
+    def handle(self, *args, **opts):
+        if opts["chats"] < 1 or opts["users"] < 2 * opts["chats"]:
+            self.stderr.write("Нужно хотя бы 2 участника на чат (--users >= 2 * --chats).")
+            return
+
+        if not opts["respect_limits"]:
+            settings.CHAT_USER_MESSAGE_RATE = settings.CHAT_WS_FRAME_RATE = 1e9
+            settings.CHAT_USER_MESSAGE_BURST = settings.CHAT_WS_FRAME_BURST = 1e9
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            users = self._populate(opts["users"], opts["chats"])
+            result = asyncio.run(self._run(users, opts))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        result.update({
+            "commit": _git_commit(),
+            "users": opts["users"],
+            "chats": opts["chats"],
+            "messages_per_user": opts["messages"],
+            "write_behind": getattr(settings, "CHAT_WRITE_BEHIND", False),
+            "channel_layer": settings.CHANNEL_LAYERS["default"]["BACKEND"],
+        })
+        self._report(result, opts.get("compare"))
+
+        out_dir = Path(opts["output"])
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"{result['commit']}.json"
+        path.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+        self.stdout.write(f"Результат сохранён: {path}")
+
+    def _populate(self, n_users, n_chats):
+        """Пользователи (профили Player создаёт сигнал) и чаты; участник -> чат по кругу."""
+        from django.contrib.auth.models import User
+        from chat.models import Chat
+
+        users = [User.objects.create_user(f"loadtest{i}", password=None) for i in range(n_users)]
+        for user in users:
+            user.cookie = _session_cookie(user)
+        chats = [Chat.objects.create() for _ in range(n_chats)]
+        by_chat = {chat.id: [] for chat in chats}
+        for i, user in enumerate(users):
+            chat = chats[i % n_chats]
+            by_chat[chat.id].append(user)
+        for chat in chats:
+            chat.participants.add(*[u.player_profile for u in by_chat[chat.id]])
+        return by_chat
+
+    async def _run(self, by_chat, opts):
+        from chat import metrics, routing
+        from chat.middleware import CachedAuthMiddlewareStack
+
+        # тот же стек, что в asgi.py: cookie -> сессия -> user/player (с кэшем)
+        app = CachedAuthMiddlewareStack(URLRouter(routing.websocket_urlpatterns))
+        counter = QueryCounter()
+        counter.install()
+
+        async def connect_all():
+            """Подключить всех; -> (сокеты, сек., SQL на сокет, мс на аутентификацию)."""
+            counter.count = 0
+            before = metrics.snapshot()
+            t0 = time.perf_counter()
+            sockets = []  # (chat_id, user, chat_socket, notify_socket)
+            for chat_id, users in by_chat.items():
+                for user in users:
+                    chat_ws = WebsocketCommunicator(app, f"/ws/chat/{chat_id}/", headers=[user.cookie])
+                    notify_ws = WebsocketCommunicator(app, "/ws/notifications/", headers=[user.cookie])
+                    assert (await chat_ws.connect())[0] and (await notify_ws.connect())[0]
+                    sockets.append((chat_id, user, chat_ws, notify_ws))
+            elapsed = time.perf_counter() - t0
+            n = len(sockets) * 2
+            return sockets, elapsed, counter.count / n, _handshake_ms(before, metrics.snapshot())
+
+        async def disconnect_all(sockets):
+            for *_, chat_ws, notify_ws in sockets:
+                await chat_ws.disconnect()
+                await notify_ws.disconnect()
+
+        sockets, connect_s, connect_queries, connect_ms = await connect_all()
+
+        per_user = opts["messages"]
+        expected = {chat_id: len(users) * per_user for chat_id, users in by_chat.items()}
+        latencies = []
+        notify_frames = 0
+
+        async def sender(chat_ws, idx):
+            for seq in range(per_user):
+                await chat_ws.send_json_to({"message": f"lt {idx} {seq} {time.perf_counter()}"})
+                if opts["interval"]:
+                    await asyncio.sleep(opts["interval"])
+
+        async def receiver(chat_ws, chat_id):
+            got = 0
+            while got < expected[chat_id]:
+                frame = json.loads((await chat_ws.receive_output(opts["timeout"]))["text"])
+                if "message" not in frame or not str(frame["message"]).startswith("lt "):
+                    continue  # presence / typing
+                latencies.append(time.perf_counter() - float(frame["message"].split()[3]))
+                got += 1
+
+        async def drain_notifications(notify_ws):
+            nonlocal notify_frames
+            while not await notify_ws.receive_nothing(0.5):
+                await notify_ws.receive_output()
+                notify_frames += 1
+
+        counter.count = 0
+        hops_before = metrics.snapshot().get("ws.db_hops", 0)
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            *(receiver(ws, chat_id) for chat_id, _, ws, _ in sockets),
+            *(sender(ws, i) for i, (_, _, ws, _) in enumerate(sockets)),
+        )
+        elapsed = time.perf_counter() - t0
+        await asyncio.gather(*(drain_notifications(n) for *_, n in sockets))
+        # write-behind: дождаться сброса буфера, чтобы запросы попали в подсчёт
+        from chat import writebehind
+        if writebehind.enabled():
+            await writebehind.get_buffer().flush()
+        message_queries = counter.count
+        message_hops = metrics.snapshot().get("ws.db_hops", 0) - hops_before
+
+        await disconnect_all(sockets)
+        # повторное подключение всех (как после деплоя) — сессии уже в кэше
+        sockets, reconnect_s, reconnect_queries, reconnect_ms = await connect_all()
+        await disconnect_all(sockets)
+
+        sent = sum(len(users) for users in by_chat.values()) * per_user
+        return {
+            "connections": len(sockets) * 2,
+            "connect_seconds": round(connect_s, 3),
+            "queries_per_connection": round(connect_queries, 2),
+            "handshake_auth_ms": connect_ms,
+            "reconnect_seconds": round(reconnect_s, 3),
+            "queries_per_reconnection": round(reconnect_queries, 2),
+            "reconnect_handshake_auth_ms": reconnect_ms,
+            "messages": sent,
+            "deliveries": len(latencies),
+            "seconds": round(elapsed, 3),
+            "messages_per_second": round(sent / elapsed, 1) if elapsed else None,
+            "latency_ms": {
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "p99": _percentile(latencies, 99),
+                "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+            },
+            "queries_per_message": round(message_queries / sent, 2),
+            "db_hops_per_message": round(message_hops / sent, 3),
+            "notify_frames_per_message": round(notify_frames / sent, 3),
+        }
+
+    def _report(self, result, compare_path):
+        previous = json.loads(Path(compare_path).read_text()) if compare_path else None
+        rows = [
+            ("сообщений/сек.", "messages_per_second"),
+            ("задержка p50, мс", ("latency_ms", "p50")),
+            ("задержка p95, мс", ("latency_ms", "p95")),
+            ("задержка p99, мс", ("latency_ms", "p99")),
+            ("SQL на сообщение", "queries_per_message"),
+            ("переходов в поток БД на сообщение", "db_hops_per_message"),
+            ("notify-кадров на сообщение", "notify_frames_per_message"),
+            ("SQL на подключение", "queries_per_connection"),
+            ("аутентификация сокета, мс", "handshake_auth_ms"),
+            ("SQL на переподключение", "queries_per_reconnection"),
+            ("аутентификация при переподкл., мс", "reconnect_handshake_auth_ms"),
+        ]
+
+        def get(data, key):
+            if isinstance(key, tuple):
+                return (data.get(key[0]) or {}).get(key[1])
+            return data.get(key)
+
+        self.stdout.write(
+            f"коммит {result['commit']}: {result['connections']} сокетов, "
+            f"{result['messages']} сообщений, {result['deliveries']} доставок за {result['seconds']} с"
+        )
+        for title, key in rows:
+            line = f"  {title:<36}{get(result, key)!s:>10}"
+            if previous is not None:
+                line += f"   (было {get(previous, key)} на {previous.get('commit')})"
+            self.stdout.write(line)
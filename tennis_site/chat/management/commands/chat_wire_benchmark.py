@@ -0,0 +1,89 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from chat import wire
+
+
+SAMPLE_TEXTS = [
+    "Привет! Играем завтра в 19:00?",
+    "Да, корт на Абая свободен, бронирую",
+    "Ок 👍",
+    "Возьми, пожалуйста, новые мячи, старые уже совсем лысые",
+    "Счёт в прошлый раз был 6:4 6:3, жду реванша!",
+]
+
+
+def _events(n):
+    """Типичные события chat_message (как их отдаёт ChatConsumer)."""
+    rnd = random.Random(42)
+    now = timezone.now()
+    return [
+        {
+            "id": 100000 + i,
+            "message": rnd.choice(SAMPLE_TEXTS),
+            "sender": rnd.choice(["Алексей", "Мария", "Dias"]),
+            "sender_photo": f"/media/players_photos/player_{rnd.randint(1, 500)}.jpg",
+            "created_at": now.isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает JSON (кадр на событие) и chat.msgpack.v1 (по одному и пачками): "
+        "байт на сообщение и CPU на сериализацию."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=20000)
+        parser.add_argument("--batch", type=int, default=10, help="событий в одном msgpack-кадре")
+        parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+
+    def handle(self, *args, **opts):
+        if wire.msgpack is None:
+            raise CommandError("msgpack не установлен")
+        n, batch = opts["messages"], max(1, opts["batch"])
+        events = _events(n)
+
+        def run_json():
+            return [json.dumps(e).encode() for e in events]
+
+        def run_msgpack_single():
+            return [wire.encode_batch([wire.pack_event("message", e)]) for e in events]
+
+        def run_msgpack_batched():
+            frames = []
+            for i in range(0, n, batch):
+                frames.append(wire.encode_batch([wire.pack_event("message", e) for e in events[i:i + batch]]))
+            return frames
+
+        results = {}
+        for name, fn in (
+            ("json", run_json),
+            ("msgpack", run_msgpack_single),
+            (f"msgpack_batch{batch}", run_msgpack_batched),
+        ):
+            started = time.process_time()
+            frames = fn()
+            cpu = time.process_time() - started
+            results[name] = {
+                "frames": len(frames),
+                "bytes_per_message": round(sum(len(f) for f in frames) / n, 1),
+                "cpu_us_per_message": round(cpu * 1e6 / n, 2),
+            }
+
+        if opts["json"]:
+            self.stdout.write(json.dumps({"messages": n, "results": results}, indent=2))
+            return
+
+        self.stdout.write(f"{n} сообщений")
+        self.stdout.write(f"{'формат':<18}{'кадров':>8}{'байт/сообщ.':>14}{'CPU мкс/сообщ.':>17}")
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<18}{r['frames']:>8}{r['bytes_per_message']:>14}{r['cpu_us_per_message']:>17}"
+            )
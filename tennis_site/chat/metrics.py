@@ -0,0 +1,162 @@
+"""
+Простые счётчики и тайминги для чата.
+
+``incr`` только прибавляет к словарю в памяти процесса — без обращений к кэшу,
+поэтому его можно звать из async-кода (send/group_send слоя, потребители).
+Фоновый поток раз в CHAT_METRICS_FLUSH_INTERVAL секунд сбрасывает накопленное в
+Django-кэш (Redis в продакшне), где значения видны всем воркерам и
+management-командам; ``snapshot()`` перед чтением сбрасывает и свой процесс.
+Ошибки кэша никогда не ломают горячий путь: несброшенное остаётся до следующего раза.
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+PREFIX = "metrics:"
+NAMES_KEY = PREFIX + "__names__"
+NAMES_LOCK_KEY = PREFIX + "__names__:lock"
+
+_pending = {}  # имя -> ещё не сброшенная в кэш прибавка
+_lock = threading.Lock()
+_known = set()  # имена, уже зарегистрированные этим процессом
+_flusher = None
+
+
+def _cache():
+    return caches[getattr(settings, "CHAT_METRICS_CACHE_ALIAS", "default")]
+
+
+def _interval():
+    return getattr(settings, "CHAT_METRICS_FLUSH_INTERVAL", 5)
+
+
+def _register(cache, names):
+    """Дописать имена в общий список; False — не удалось взять блокировку."""
+    new = [n for n in names if n not in _known]
+    if not new:
+        return True
+    # read-modify-write списка под блокировкой: иначе два процесса теряют имена друг друга
+    for _ in range(20):
+        if cache.add(NAMES_LOCK_KEY, 1, timeout=5):
+            break
+        time.sleep(0.005)
+    else:
+        return False
+    try:
+        registered = set(cache.get(NAMES_KEY) or ())
+        if not registered.issuperset(new):
+            cache.set(NAMES_KEY, sorted(registered.union(new)), timeout=None)
+    finally:
+        cache.delete(NAMES_LOCK_KEY)
+    _known.update(new)
+    return True
+
+
+def flush():
+    """Сбросить накопленные в процессе значения в кэш."""
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return
+    done = set()
+    try:
+        cache = _cache()
+        if not _register(cache, batch):
+            _requeue(batch)  # список имён занят другим процессом — в следующий раз
+            return
+        for name, value in batch.items():
+            key = PREFIX + name
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                # ключа ещё нет — создаём (add не перетрёт чужой инкремент)
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, value)
+            done.add(name)
+    except Exception:
+        _requeue({n: v for n, v in batch.items() if n not in done})
+
+
+def _requeue(batch):
+    """Вернуть несброшенное, чтобы не потерять его."""
+    with _lock:
+        for name, value in batch.items():
+            _pending[name] = _pending.get(name, 0) + value
+
+
+def _flush_loop():
+    while True:
+        time.sleep(_interval())
+        flush()
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name="chat-metrics", daemon=True)
+    _flusher.start()
+    atexit.register(flush)
+
+
+def incr(name, value=1):
+    """Увеличить счётчик ``name`` на ``value`` (в памяти процесса)."""
+    with _lock:
+        _pending[name] = _pending.get(name, 0) + value
+    if _flusher is None:
+        _start_flusher()
+
+
+def observe_ms(name, ms):
+    """Записать длительность в миллисекундах (count + суммарное время)."""
+    incr(f"{name}.count")
+    incr(f"{name}.total_us", int(ms * 1000))
+
+
+@contextmanager
+def timer(name):
+    """Контекстный менеджер: замеряет время блока и пишет его в ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_ms(name, (time.perf_counter() - started) * 1000)
+
+
+def snapshot():
+    """Вернуть словарь всех метрик; для таймингов добавляется ``avg_ms``."""
+    flush()
+    try:
+        cache = _cache()
+        names = cache.get(NAMES_KEY) or []
+        values = cache.get_many([PREFIX + n for n in names])
+    except Exception:
+        return {}
+
+    data = {n: values.get(PREFIX + n, 0) for n in names}
+    for name in [n for n in names if n.endswith(".count")]:
+        base = name[: -len(".count")]
+        count = data.get(name) or 0
+        total_us = data.get(f"{base}.total_us") or 0
+        if count:
+            data[f"{base}.avg_ms"] = round(total_us / count / 1000, 3)
+    return data
+
+
+def reset():
+    """Обнулить все метрики (для бенчмарков)."""
+    with _lock:
+        _pending.clear()
+    try:
+        cache = _cache()
+        names = cache.get(NAMES_KEY) or []
+        cache.delete_many([PREFIX + n for n in names] + [NAMES_KEY])
+    except Exception:
+        pass
+    _known.clear()
@@ -0,0 +1,98 @@
+"""
+Аутентификация WebSocket-рукопожатия с кэшем.
+
+``AuthMiddlewareStack`` на каждом подключении читает из БД сессию и User, а
+потребитель затем ещё и игрока. Здесь сессия -> (User, player_id) кэшируется на
+CHAT_WS_AUTH_TTL секунд под ключом от хэша session key; в scope кладутся
+``user`` (настоящий User, как раньше) и ``player_id``.
+
+Сброс (chat/signals.py):
+* выход — удаляется запись этой сессии;
+* сохранение User (пароль, is_active …) и создание/удаление Player — меняется
+  «версия» пользователя, и все его записи перестают считаться действительными.
+
+Время разрешения пишется в метрику ``ws.handshake_auth``, попадания/промахи —
+``ws.auth_cache_hit`` / ``ws.auth_cache_miss``.
+"""
+import hashlib
+import uuid
+
+from channels.auth import get_user
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from channels.sessions import CookieMiddleware, SessionMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+
+from players.models import Player
+
+from . import metrics
+
+
+def _ttl():
+    return getattr(settings, "CHAT_WS_AUTH_TTL", 60)
+
+
+def _session_key(session_key):
+    digest = hashlib.sha256(session_key.encode()).hexdigest()[:32]
+    return f"ws:auth:{digest}"
+
+
+def _version_key(user_id):
+    return f"ws:auth:user:{user_id}"
+
+
+def forget_session(session_key):
+    """Выход: запись сессии больше не действительна."""
+    if session_key:
+        cache.delete(_session_key(session_key))
+
+
+def invalidate_user(user_id):
+    """Изменился пользователь или его игрок — сбросить все его сессии в кэше."""
+    # версия живёт дольше записей: после её истечения запись просто не совпадёт
+    cache.set(_version_key(user_id), uuid.uuid4().hex, timeout=_ttl() * 2)
+
+
+@database_sync_to_async
+def _player_id(user_id):
+    return Player.objects.filter(user_id=user_id).values_list("id", flat=True).first()
+
+
+async def resolve(scope):
+    """``(user, player_id)`` для scope с cookie сессии; AnonymousUser, если не вошёл."""
+    session_key = scope.get("cookies", {}).get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return AnonymousUser(), None
+
+    key = _session_key(session_key)
+    # a*-методы кэша: синхронный Redis-клиент не должен блокировать event loop
+    entry = await cache.aget(key)
+    if entry is not None and entry["version"] == await cache.aget(_version_key(entry["user"].pk)):
+        metrics.incr("ws.auth_cache_hit")
+        return entry["user"], entry["player_id"]
+
+    metrics.incr("ws.auth_cache_miss")
+    user = await get_user(scope)  # сессия + User + проверка хэша пароля
+    if not user.is_authenticated:
+        return user, None
+    # версия до чтения игрока: сброс во время загрузки не даст закэшировать старое
+    version = await cache.aget(_version_key(user.pk))
+    player_id = await _player_id(user.pk)
+    await cache.aset(key, {"user": user, "player_id": player_id, "version": version}, timeout=_ttl())
+    return user, player_id
+
+
+class CachedAuthMiddleware(BaseMiddleware):
+    """Замена channels.auth.AuthMiddleware: scope["user"] и scope["player_id"] из кэша."""
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        with metrics.timer("ws.handshake_auth"):
+            scope["user"], scope["player_id"] = await resolve(scope)
+        return await super().__call__(scope, receive, send)
+
+
+def CachedAuthMiddlewareStack(inner):
+    return CookieMiddleware(SessionMiddleware(CachedAuthMiddleware(inner)))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_read_states(apps, schema_editor):
+    """Посчитать непрочитанные по существующим сообщениям (is_read=False)."""
+    Chat = apps.get_model("chat", "Chat")
+    Message = apps.get_model("chat", "Message")
+    ChatReadState = apps.get_model("chat", "ChatReadState")
+
+    # chat_id -> {sender_id: число непрочитанных}
+    unread = {}
+    rows = Message.objects.filter(is_read=False).values("chat_id", "sender_id").annotate(n=models.Count("id"))
+    for row in rows:
+        unread.setdefault(row["chat_id"], {})[row["sender_id"]] = row["n"]
+
+    states = []
+    through = Chat.participants.through
+    for link in through.objects.values("chat_id", "player_id").iterator():
+        chat_id, player_id = link["chat_id"], link["player_id"]
+        count = sum(n for sender_id, n in unread.get(chat_id, {}).items() if sender_id != player_id)
+        states.append(ChatReadState(chat_id=chat_id, player_id=player_id, unread_count=count))
+    ChatReadState.objects.bulk_create(states, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_chat_messag_chat_id_0c7b25_idx_and_more'),
+        ('players', '0003_alter_achievement_options_alter_player_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chat.chat')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_states', to='players.player')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('chat', 'player'), name='chat_readstate_chat_player_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_read_states, migrations.RunPython.noop),
+    ]
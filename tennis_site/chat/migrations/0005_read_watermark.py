@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+def backfill_watermarks(apps, schema_editor):
+    """
+    Знак прочтения = сообщение перед первым непрочитанным чужим (is_read=False),
+    а если непрочитанных нет — последнее сообщение чата.
+    """
+    Message = apps.get_model("chat", "Message")
+    ChatReadState = apps.get_model("chat", "ChatReadState")
+
+    for state in ChatReadState.objects.all().iterator():
+        messages = Message.objects.filter(chat_id=state.chat_id)
+        first_unread = (
+            messages.filter(is_read=False).exclude(sender_id=state.player_id)
+            .order_by("id").values_list("id", flat=True).first()
+        )
+        if first_unread is not None:
+            state.last_read_message_id = first_unread - 1
+        else:
+            state.last_read_message_id = messages.order_by("-id").values_list("id", flat=True).first() or 0
+        state.unread_count = (
+            messages.filter(id__gt=state.last_read_message_id).exclude(sender_id=state.player_id).count()
+        )
+        state.save(update_fields=["last_read_message_id", "unread_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_chatreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatreadstate',
+            name='last_read_message_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='chat_messag_is_read_872c73_idx',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
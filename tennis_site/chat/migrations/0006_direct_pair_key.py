@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_pair_keys(apps, schema_editor):
+    """
+    Проставить ключ чатам ровно из двух участников. Если у пары уже несколько
+    чатов (дубли из-за гонки), ключ получает чат с самым свежим сообщением,
+    остальные остаются без ключа — они видны в списке, но новые не откроются.
+    """
+    Chat = apps.get_model("chat", "Chat")
+    Message = apps.get_model("chat", "Message")
+    Through = Chat.participants.through
+
+    members = {}
+    for chat_id, player_id in Through.objects.values_list("chat_id", "player_id"):
+        members.setdefault(chat_id, set()).add(player_id)
+
+    last_ids = dict(
+        Message.objects.order_by().values("chat_id").annotate(last=models.Max("id")).values_list("chat_id", "last")
+    )
+
+    best = {}  # (low, high) -> (last_message_id, chat_id)
+    for chat_id, players in members.items():
+        if len(players) != 2:
+            continue
+        key = tuple(sorted(players))
+        candidate = (last_ids.get(chat_id, 0), chat_id)
+        if key not in best or candidate > best[key]:
+            best[key] = candidate
+
+    for (low, high), (_, chat_id) in best.items():
+        Chat.objects.filter(id=chat_id).update(min_player_id=low, max_player_id=high)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_read_watermark'),
+        ('players', '0003_alter_achievement_options_alter_player_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='max_player',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='players.player'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='min_player',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='players.player'),
+        ),
+        migrations.RunPython(backfill_pair_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.UniqueConstraint(fields=('min_player', 'max_player'), name='chat_direct_pair_uniq'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+
+# FTS5-индекс по тексту сообщений (external content: сам текст хранится только в chat_message).
+# Синхронизируется триггерами, поэтому покрывает и bulk_create (write-behind), и .update().
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5(
+        text,
+        content='chat_message',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_ai AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_message_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_ad AFTER DELETE ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chat_message_fts_au AFTER UPDATE OF text ON chat_message BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO chat_message_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    # проиндексировать уже существующие сообщения
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_au",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ai",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    # только SQLite; на других БД поиск работает через icontains (chat/search.py)
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_direct_pair_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
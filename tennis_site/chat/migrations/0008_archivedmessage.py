@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_fts'),
+        ('players', '0003_alter_achievement_options_alter_player_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('chat', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='chat.chat')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='players.player')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['chat', 'id'], name='chat_archiv_chat_id_ac123b_idx')],
+            },
+        ),
+    ]
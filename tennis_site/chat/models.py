@@ -6,12 +6,32 @@ from players.models import Player
 class Chat(models.Model):
     participants = models.ManyToManyField(Player, related_name="chats")
 
+    # Ключ личного чата: (меньший id, больший id) пары игроков — уникален,
+    # поэтому поиск/создание чата двух игроков — один запрос по индексу.
+    min_player = models.ForeignKey(
+        Player, related_name="+", on_delete=models.CASCADE, null=True, blank=True
+    )
+    max_player = models.ForeignKey(
+        Player, related_name="+", on_delete=models.CASCADE, null=True, blank=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["min_player", "max_player"], name="chat_direct_pair_uniq"),
+        ]
+
     def __str__(self):
         return f"Chat {self.pk}"
 
     def other_for(self, me: Player):
-        """Вернёт второго участника чата относительно текущего игрока."""
-        return self.participants.exclude(id=me.id).first()
+        """Вернёт второго участника чата относительно текущего игрока.
+
+        Перебирает participants.all(), поэтому использует prefetch_related, если он есть.
+        """
+        for player in self.participants.all():
+            if player.id != me.id:
+                return player
+        return None
 
     def last_message(self):
         return self.messages.order_by("-created_at").select_related("sender").first()
@@ -22,14 +42,56 @@ class Message(models.Model):
     sender = models.ForeignKey(Player, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
-    is_read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ["created_at"]
         indexes = [
             models.Index(fields=["chat", "created_at"]),
-            models.Index(fields=["is_read"]),
         ]
 
     def __str__(self):
         return f"{self.sender} | {self.text[:30]}"
+
+
+class ArchivedMessage(models.Model):
+    """
+    Старые сообщения, вынесенные из chat_message командой archive_messages.
+
+    id совпадает с id исходного Message, поэтому курсоры истории (before=<id>)
+    и водяные знаки прочтения продолжают работать без изменений.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    chat = models.ForeignKey(Chat, related_name="archived_messages", on_delete=models.CASCADE, db_index=False)
+    sender = models.ForeignKey(Player, related_name="+", on_delete=models.CASCADE)
+    text = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["chat", "id"]),
+        ]
+
+    def __str__(self):
+        return f"[archive] {self.sender} | {self.text[:30]}"
+
+
+class ChatReadState(models.Model):
+    """
+    Состояние прочтения чата участником.
+
+    last_read_message_id — водяной знак: всё до него включительно прочитано.
+    unread_count — денормализованное число чужих сообщений новее знака.
+    """
+    chat = models.ForeignKey(Chat, related_name="read_states", on_delete=models.CASCADE)
+    player = models.ForeignKey(Player, related_name="chat_read_states", on_delete=models.CASCADE)
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["chat", "player"], name="chat_readstate_chat_player_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.player} | chat {self.chat_id}: {self.unread_count}"
@@ -0,0 +1,76 @@
+"""
+Уведомления пользователю через группу ``user_{id}`` (NotificationConsumer и SSE).
+
+Отправитель шлёт лёгкое событие ``notify`` без подсчётов: ``kind`` (``unread``,
+``friend_request``, ``match_joined`` …) и, при необходимости, ``data``.
+Получатель копит события CHAT_NOTIFY_DEBOUNCE секунд (``NotifyBatch``) и отдаёт
+клиенту один кадр на пачку: счётчик непрочитанных считается один раз,
+остальные события — списком. Пачка из 20 сообщений = 1 подсчёт и 1 кадр.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import metrics
+
+UNREAD = "unread"
+
+
+def debounce_window():
+    return getattr(settings, "CHAT_NOTIFY_DEBOUNCE", 0.3)
+
+
+def _event(kind, data):
+    event = {"type": "notify", "kind": kind}
+    if data is not None:
+        event["data"] = data
+    return event
+
+
+async def anotify_users(user_ids, kind=UNREAD, data=None):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    event = _event(kind, data)
+    for uid in user_ids:
+        if uid is not None:
+            await layer.group_send(f"user_{uid}", event)
+    metrics.incr("notify.sent", len(user_ids))
+
+
+def notify_users(user_ids, kind=UNREAD, data=None):
+    """Синхронная версия для представлений и сигналов (вызывать после коммита)."""
+    if user_ids:
+        async_to_sync(anotify_users)(list(user_ids), kind, data)
+
+
+class NotifyBatch:
+    """События notify, накопленные за окно debounce, для одного соединения."""
+
+    def __init__(self):
+        self.unread = False
+        self.events = []
+        self.received = 0
+
+    def add(self, event):
+        self.received += 1
+        kind = event.get("kind", UNREAD)
+        if kind == UNREAD:
+            self.unread = True
+        else:
+            self.events.append({"kind": kind, "data": event.get("data")})
+
+    def __bool__(self):
+        return bool(self.received)
+
+    def payload(self, unread_count):
+        """Один кадр на пачку; unread_count — None, если счётчик не менялся."""
+        metrics.incr("notify.frames")
+        if self.received > 1:
+            metrics.incr("notify.coalesced", self.received - 1)
+        payload = {}
+        if unread_count is not None:
+            payload["unread_count"] = unread_count
+        if self.events:
+            payload["events"] = self.events
+        return payload
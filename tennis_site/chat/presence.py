@@ -0,0 +1,161 @@
+"""
+Присутствие (online / last seen) и индикатор набора текста.
+
+Всё живёт в кэше с TTL, без запросов к БД:
+* ``presence:conns:{uid}`` — число открытых соединений пользователя (WebSocket/SSE);
+  TTL продлевается heartbeat-ом, поэтому «зависшие» соединения сами истекают;
+* ``presence:seen:{uid}`` — время последнего отключения;
+* ``presence:typing:{chat}:{uid}`` — окно троттлинга «печатает…»: пока ключ жив,
+  повторные события набора не рассылаются.
+
+У функций есть async-версии с префиксом ``a`` (``aconnect``, ``aheartbeat`` …)
+для потребителей и SSE-потока: они ходят в кэш через ``cache.a*`` и не
+блокируют event loop.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import metrics
+
+
+_SEEN_TTL = 30 * 24 * 3600
+
+
+def _ttl():
+    return getattr(settings, "CHAT_PRESENCE_TTL", 60)
+
+
+def _conns_key(user_id):
+    return f"presence:conns:{user_id}"
+
+
+def _seen_key(user_id):
+    return f"presence:seen:{user_id}"
+
+
+def connect(user_id):
+    """Новое соединение. True — пользователь только что стал online."""
+    key = _conns_key(user_id)
+    cache.add(key, 0, timeout=_ttl())
+    try:
+        count = cache.incr(key)
+    except ValueError:  # ключ истёк между add и incr
+        cache.set(key, 1, timeout=_ttl())
+        count = 1
+    return count == 1
+
+
+def heartbeat(user_id):
+    """Продлить online; вызывать чаще, чем раз в CHAT_PRESENCE_TTL."""
+    if not cache.touch(_conns_key(user_id), timeout=_ttl()):
+        connect(user_id)
+
+
+def disconnect(user_id):
+    """Соединение закрыто. True — это было последнее, пользователь offline."""
+    key = _conns_key(user_id)
+    try:
+        count = cache.decr(key)
+    except ValueError:
+        count = 0
+    if count > 0:
+        return False
+    cache.delete(key)
+    cache.set(_seen_key(user_id), _offline_since(), timeout=_SEEN_TTL)
+    return True
+
+
+def status(user_id):
+    """``{"user_id", "online", "last_seen"}`` для отправки клиенту."""
+    online = (cache.get(_conns_key(user_id)) or 0) > 0
+    return {
+        "user_id": user_id,
+        "online": online,
+        "last_seen": None if online else cache.get(_seen_key(user_id)),
+    }
+
+
+def _offline_since():
+    return timezone.now().isoformat()
+
+
+def presence_event(user_id):
+    """Событие ``chat_presence`` для группы ``chat_{id}``."""
+    metrics.incr("presence.broadcast")
+    return {"type": "chat_presence", **status(user_id)}
+
+
+def _typing_counted(allowed):
+    metrics.incr("typing.sent" if allowed else "typing.coalesced")
+    return allowed
+
+
+def _typing_key(chat_id, user_id):
+    return f"presence:typing:{chat_id}:{user_id}"
+
+
+def _typing_throttle():
+    return getattr(settings, "CHAT_TYPING_THROTTLE", 3)
+
+
+def typing_allowed(chat_id, user_id):
+    """
+    Троттлинг «печатает…»: не чаще раза в CHAT_TYPING_THROTTLE секунд на пользователя
+    в чате (общий для всех вкладок и воркеров). Лишние события просто отбрасываются —
+    клиент держит индикатор, пока они приходят.
+    """
+    return _typing_counted(cache.add(_typing_key(chat_id, user_id), 1, timeout=_typing_throttle()))
+
+
+def typing_event(user_id):
+    return {"type": "chat_typing", "user_id": user_id}
+
+
+# ===== async-версии (WebSocket-потребители, SSE) =====
+
+async def aconnect(user_id):
+    key = _conns_key(user_id)
+    await cache.aadd(key, 0, timeout=_ttl())
+    try:
+        count = await cache.aincr(key)
+    except ValueError:  # ключ истёк между add и incr
+        await cache.aset(key, 1, timeout=_ttl())
+        count = 1
+    return count == 1
+
+
+async def aheartbeat(user_id):
+    if not await cache.atouch(_conns_key(user_id), timeout=_ttl()):
+        await aconnect(user_id)
+
+
+async def adisconnect(user_id):
+    key = _conns_key(user_id)
+    try:
+        count = await cache.adecr(key)
+    except ValueError:
+        count = 0
+    if count > 0:
+        return False
+    await cache.adelete(key)
+    await cache.aset(_seen_key(user_id), _offline_since(), timeout=_SEEN_TTL)
+    return True
+
+
+async def astatus(user_id):
+    online = (await cache.aget(_conns_key(user_id)) or 0) > 0
+    return {
+        "user_id": user_id,
+        "online": online,
+        "last_seen": None if online else await cache.aget(_seen_key(user_id)),
+    }
+
+
+async def apresence_event(user_id):
+    metrics.incr("presence.broadcast")
+    return {"type": "chat_presence", **await astatus(user_id)}
+
+
+async def atyping_allowed(chat_id, user_id):
+    return _typing_counted(await cache.aadd(_typing_key(chat_id, user_id), 1, timeout=_typing_throttle()))
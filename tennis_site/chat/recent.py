@@ -0,0 +1,156 @@
+"""
+Кольцевой буфер последних сообщений чата в кэше.
+
+Ключ ``chat:recent:{chat_id}`` хранит ``{"rows": [...], "older": bool}``:
+последние CHAT_RECENT_SIZE сообщений (строки values() с полями
+serializers.MESSAGE_FIELDS, по возрастанию id) и признак «есть сообщения
+старше первой строки» (в chat_message или в архиве). Буфер содержит *все*
+сообщения чата с id >= rows[0].id, поэтому окна внутри него можно отдавать
+без БД. Пополняется при отправке (register_messages -> on_commit), строится
+при первом промахе. Попадания/промахи — метрики recent.hit / recent.miss.
+
+Буфер верен, только если кэш общий для всех воркеров: в LocMemCache каждый
+процесс видит лишь свои отправки и отдавал бы окна без чужих сообщений. Поэтому
+с локальным кэшем (нет REDIS_URL) буфер выключен и окна читаются из БД;
+CHAT_RECENT_BUFFER=True/False включает/выключает его принудительно.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .models import ArchivedMessage, Message
+from .serializers import MESSAGE_FIELDS
+
+# кэши, которые не разделяются между процессами
+_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def _key(chat_id):
+    return f"chat:recent:{chat_id}"
+
+
+def _lock_key(chat_id):
+    return f"chat:recent:{chat_id}:lock"
+
+
+def enabled():
+    """Включён ли буфер: явно через CHAT_RECENT_BUFFER или по общему кэшу."""
+    mode = getattr(settings, "CHAT_RECENT_BUFFER", None)
+    if mode is not None:
+        return bool(mode)
+    return settings.CACHES["default"]["BACKEND"] not in _LOCAL_CACHES
+
+
+def size():
+    return getattr(settings, "CHAT_RECENT_SIZE", 101)
+
+
+def _ttl():
+    return getattr(settings, "CHAT_RECENT_TTL", 3600)
+
+
+def _acquire(chat_id, attempts=20):
+    """Короткая блокировка на read-modify-write буфера (общая для всех воркеров)."""
+    for _ in range(attempts):
+        if cache.add(_lock_key(chat_id), 1, timeout=1):
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def _release(chat_id):
+    cache.delete(_lock_key(chat_id))
+
+
+def invalidate(chat_id):
+    cache.delete(_key(chat_id))
+
+
+def push(messages):
+    """Добавить сохранённые сообщения (с id) в буферы их чатов."""
+    if not enabled():
+        return
+    by_chat = {}
+    for msg in messages:
+        if msg.id is not None:
+            by_chat.setdefault(msg.chat_id, []).append(
+                {"id": msg.id, "text": msg.text, "sender_id": msg.sender_id, "created_at": msg.created_at}
+            )
+    for chat_id, rows in by_chat.items():
+        if not _acquire(chat_id):
+            invalidate(chat_id)  # не дождались — пусть перестроится из БД
+            continue
+        try:
+            buf = cache.get(_key(chat_id))
+            if buf is None:
+                continue  # буфера нет — построится при чтении
+            # буфер мог быть построен уже после коммита этих сообщений — без дублей
+            known = {r["id"] for r in buf["rows"]}
+            floor = buf["rows"][0]["id"] if (buf["older"] and buf["rows"]) else 0
+            merged = buf["rows"] + [r for r in rows if r["id"] not in known and r["id"] > floor]
+            merged.sort(key=lambda r: r["id"])
+            keep = size()
+            buf = {"rows": merged[-keep:], "older": buf["older"] or len(merged) > keep}
+            cache.set(_key(chat_id), buf, timeout=_ttl())
+        finally:
+            _release(chat_id)
+
+
+def fill(chat_id):
+    """Построить буфер из БД (последние size() сообщений)."""
+    keep = size()
+    if not _acquire(chat_id):
+        return None
+    try:
+        rows = list(
+            Message.objects.filter(chat_id=chat_id).order_by("-id").values(*MESSAGE_FIELDS)[: keep + 1]
+        )
+        older = len(rows) > keep
+        rows = rows[:keep]
+        rows.reverse()
+        if not older:
+            archived = ArchivedMessage.objects.filter(chat_id=chat_id)
+            if rows:
+                archived = archived.filter(id__lt=rows[0]["id"])
+            older = archived.exists()
+        buf = {"rows": rows, "older": older}
+        cache.set(_key(chat_id), buf, timeout=_ttl())
+        return buf
+    finally:
+        _release(chat_id)
+
+
+def _from_buffer(buf, before, after, limit):
+    rows, older = buf["rows"], buf["older"]
+    first_id = rows[0]["id"] if rows else None
+
+    if after is not None:
+        # всё новее after есть в буфере, если after не старше его начала
+        if older and (first_id is None or after < first_id):
+            return None
+        newer = [r for r in rows if r["id"] > after]
+        return newer[:limit], len(newer) > limit
+
+    candidates = rows if before is None else [r for r in rows if r["id"] < before]
+    if len(candidates) > limit:
+        return candidates[-limit:], True
+    if not older:
+        return candidates, False
+    return None  # нужна более старая история — это БД
+
+
+def window(chat_id, before=None, after=None, limit=50):
+    """Окно как у services.message_window(as_values=True) или None, если буфер не покрывает запрос."""
+    if not enabled():
+        return None
+    buf = cache.get(_key(chat_id))
+    if buf is None and before is None:
+        buf = fill(chat_id)
+    result = _from_buffer(buf, before, after, limit) if buf is not None else None
+    metrics.incr("recent.hit" if result is not None else "recent.miss")
+    return result
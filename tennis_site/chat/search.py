@@ -0,0 +1,89 @@
+"""
+Поиск по сообщениям чатов пользователя.
+
+На SQLite — FTS5-таблица chat_message_fts (миграция 0007, синхронизируется триггерами):
+ранжирование bm25, сниппеты с подсветкой. На других БД или без FTS5 — icontains
+по чатам пользователя (медленно, но корректно).
+"""
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.text import Truncator
+
+from tennis_site import fts
+
+from .models import Chat, Message
+
+FTS_TABLE = "chat_message_fts"
+
+# маркеры подсветки из snippet(): управляющие символы, которых нет в тексте после экранирования
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+
+def fts_available():
+    return fts.table_available(FTS_TABLE)
+
+
+def fts_query(text):
+    """Пользовательский ввод -> безопасный запрос FTS5 (последнее слово — по префиксу)."""
+    return fts.match_query(text)
+
+
+def _highlight(snippet):
+    return escape(snippet).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def search_page_size():
+    return getattr(settings, "CHAT_SEARCH_PAGE_SIZE", 20)
+
+
+def search_messages(player, query, page=1):
+    """
+    Сообщения из чатов игрока, подходящие под ``query``.
+    Возвращает ``(hits, has_more)``; hit — ``(message, snippet_html)``, лучшие первыми.
+    """
+    size = search_page_size()
+    offset = (max(page, 1) - 1) * size
+
+    if fts_available():
+        ranked = _fts_ids(player.id, query, size + 1, offset)
+    else:
+        ranked = _fallback_ids(player.id, query, size + 1, offset)
+
+    has_more = len(ranked) > size
+    ranked = ranked[:size]
+    by_id = Message.objects.select_related("sender").in_bulk([mid for mid, _ in ranked])
+    hits = [(by_id[mid], snippet) for mid, snippet in ranked if mid in by_id]
+    return hits, has_more
+
+
+def _fts_ids(player_id, query, limit, offset):
+    match = fts_query(query)
+    if not match:
+        return []
+    through = Chat.participants.through._meta.db_table
+    sql = f"""
+        SELECT m.id, snippet({FTS_TABLE}, 0, %s, %s, '…', 12)
+        FROM {FTS_TABLE}
+        JOIN {Message._meta.db_table} m ON m.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s
+          AND m.chat_id IN (SELECT chat_id FROM {through} WHERE player_id = %s)
+        ORDER BY bm25({FTS_TABLE}), m.id DESC
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_MARK_OPEN, _MARK_CLOSE, match, player_id, limit, offset])
+        return [(mid, _highlight(snippet)) for mid, snippet in cursor.fetchall()]
+
+
+def _fallback_ids(player_id, query, limit, offset):
+    query = (query or "").strip()
+    if not query:
+        return []
+    rows = (
+        Message.objects
+        .filter(chat__participants=player_id, text__icontains=query)
+        .order_by("-id")
+        .values_list("id", "text")[offset:offset + limit]
+    )
+    return [(mid, escape(Truncator(text).chars(120))) for mid, text in rows]
@@ -0,0 +1,86 @@
+"""
+Сериализация сообщений чата для JSON/шаблонов.
+
+Сообщения читаются через values() (только нужные колонки, без JOIN на игрока),
+а имя и аватар отправителя берутся из «карточки» игрока: она считается один раз
+(photo.url — это обращение к storage, в Cloudinary ещё и подпись URL) и кэшируется
+до сохранения/удаления Player (сигналы в chat/signals.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from players.models import Player
+
+MESSAGE_FIELDS = ("id", "text", "sender_id", "created_at")
+
+
+def _card_key(player_id):
+    return f"chat:sender:{player_id}"
+
+
+def _card(player):
+    photo = None
+    if player.photo:
+        try:
+            photo = player.photo.url
+        except Exception:  # файл/облако недоступны — без аватара
+            photo = None
+    return {"name": player.first_name, "photo": photo}
+
+
+def sender_cards(player_ids):
+    """``{player_id: {"name", "photo"}}`` — из кэша, промахи одним запросом."""
+    ids = set(player_ids)
+    if not ids:
+        return {}
+    cached = cache.get_many([_card_key(pid) for pid in ids])
+    cards = {pid: cached[_card_key(pid)] for pid in ids if _card_key(pid) in cached}
+    missing = ids - cards.keys()
+    if missing:
+        fresh = {p.id: _card(p) for p in Player.objects.filter(id__in=missing).only("id", "first_name", "photo")}
+        cache.set_many(
+            {_card_key(pid): card for pid, card in fresh.items()},
+            timeout=getattr(settings, "CHAT_SENDER_CACHE_TTL", 86400),
+        )
+        cards.update(fresh)
+    return cards
+
+
+def sender_card(player):
+    """Карточка уже загруженного игрока (без запроса к БД при промахе)."""
+    key = _card_key(player.id)
+    card = cache.get(key)
+    if card is None:
+        card = _card(player)
+        cache.set(key, card, timeout=getattr(settings, "CHAT_SENDER_CACHE_TTL", 86400))
+    return card
+
+
+def invalidate_sender_card(player_id):
+    cache.delete(_card_key(player_id))
+
+
+def serialize_messages(rows, me_id, absolute=None, iso_dates=True):
+    """
+    rows — dict-ы из values(*MESSAGE_FIELDS). absolute — request.build_absolute_uri
+    (вызывается один раз на отправителя, а не на сообщение).
+    """
+    cards = sender_cards(row["sender_id"] for row in rows)
+    photos = {}
+    for pid, card in cards.items():
+        photo = card["photo"]
+        photos[pid] = absolute(photo) if (absolute and photo) else photo
+
+    result = []
+    for row in rows:
+        sender_id = row["sender_id"]
+        card = cards.get(sender_id) or {"name": None}
+        result.append({
+            "id": row["id"],
+            "text": row["text"],
+            "sender_name": card["name"],
+            "sender_photo": photos.get(sender_id),
+            "mine": sender_id == me_id,
+            "created_at": row["created_at"].isoformat() if iso_dates else row["created_at"],
+        })
+    return result
@@ -0,0 +1,351 @@
+# tennis_site/chat/services.py
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from players.models import Player
+
+from . import notifications, recent, serializers
+from .models import ArchivedMessage, Chat, ChatReadState, Message
+
+
+# ===== Личные чаты =====
+
+def get_or_create_direct_chat(me, other):
+    """
+    Личный чат двух игроков по ключу (min_player, max_player).
+    Поиск — один запрос по уникальному индексу; при гонке двух запросов
+    уникальный ключ не даст создать дубль, проигравший получит уже созданный чат.
+    """
+    low, high = sorted((me.id, other.id))
+    with transaction.atomic():
+        chat, created = Chat.objects.get_or_create(min_player_id=low, max_player_id=high)
+        if created:
+            chat.participants.add(low, high)
+    return chat
+
+
+# ===== Участники чата (кэш для проверки доступа) =====
+
+def _members_key(chat_id):
+    return f"chat:members:{chat_id}"
+
+
+def chat_members(chat_id):
+    """
+    Участники чата как список пар ``(player_id, user_id)``; None — чата нет.
+    Кэшируется; сбрасывается сигналами (m2m_changed participants, удаление чата).
+    """
+    key = _members_key(chat_id)
+    members = cache.get(key)
+    if members is None:
+        members = list(
+            Chat.participants.through.objects
+            .filter(chat_id=chat_id)
+            .values_list("player_id", "player__user_id")
+        )
+        if not members and not Chat.objects.filter(id=chat_id).exists():
+            return None
+        cache.set(key, members, timeout=getattr(settings, "CHAT_MEMBERS_CACHE_TTL", 3600))
+    return members
+
+
+def invalidate_members_cache(chat_id):
+    cache.delete(_members_key(chat_id))
+
+
+def member_player_id(chat_id, user_id):
+    """player_id пользователя в чате или None, если он не участник."""
+    for player_id, member_user_id in chat_members(chat_id) or ():
+        if member_user_id == user_id:
+            return player_id
+    return None
+
+
+def is_member(chat_id, user_id):
+    return member_player_id(chat_id, user_id) is not None
+
+
+def other_member_user_ids(chat_id, user_id):
+    return [uid for _, uid in chat_members(chat_id) or () if uid is not None and uid != user_id]
+
+
+# ===== Счётчики непрочитанных =====
+
+def _unread_key(user_id):
+    return f"chat:unread:{user_id}"
+
+
+def _bump_unread_cache(user_ids, delta):
+    """Сдвинуть закэшированные суммы; если ключа нет — его посчитают при чтении."""
+    for uid in user_ids:
+        if uid is None or not delta:
+            continue
+        try:
+            cache.incr(_unread_key(uid), delta)
+        except ValueError:
+            pass
+
+
+def invalidate_unread_cache(user_ids):
+    cache.delete_many([_unread_key(uid) for uid in user_ids if uid is not None])
+
+
+def ensure_read_states(chat_id, player_ids):
+    """Создать строки ChatReadState для участников (если их ещё нет)."""
+    ensure_read_state_pairs([(chat_id, pid) for pid in player_ids])
+
+
+def ensure_read_state_pairs(pairs):
+    """То же для произвольных пар ``(chat_id, player_id)`` — одним INSERT."""
+    ChatReadState.objects.bulk_create(
+        [ChatReadState(chat_id=chat_id, player_id=pid) for chat_id, pid in pairs],
+        ignore_conflicts=True,
+    )
+
+
+def register_message(message: Message):
+    """
+    Новое сообщение: +1 непрочитанное всем участникам, кроме отправителя.
+    Вызывается из post_save, поэтому работает в той же транзакции, что и INSERT.
+    """
+    return register_messages([message])
+
+
+def register_messages(messages):
+    """
+    Пачка новых сообщений (bulk_create не шлёт post_save): каждому участнику
+    прибавляется число сообщений, отправленных не им. Возвращает user_id получателей.
+    """
+    # chat_id -> {sender_id: сколько сообщений}
+    per_chat = {}
+    for msg in messages:
+        senders = per_chat.setdefault(msg.chat_id, {})
+        senders[msg.sender_id] = senders.get(msg.sender_id, 0) + 1
+
+    states = ChatReadState.objects.filter(chat_id__in=per_chat).values_list("id", "chat_id", "player_id", "player__user_id")
+    # delta -> [state ids], чтобы обойтись одним UPDATE на каждое значение прироста
+    by_delta = {}
+    bumps = {}
+    for state_id, chat_id, player_id, user_id in states:
+        delta = sum(n for sender_id, n in per_chat[chat_id].items() if sender_id != player_id)
+        if delta:
+            by_delta.setdefault(delta, []).append(state_id)
+            bumps[user_id] = bumps.get(user_id, 0) + delta
+
+    for delta, ids in by_delta.items():
+        ChatReadState.objects.filter(id__in=ids).update(unread_count=F("unread_count") + delta)
+
+    def _bump():
+        for uid, delta in bumps.items():
+            _bump_unread_cache([uid], delta)
+        recent.push(messages)
+    transaction.on_commit(_bump)
+    return [uid for uid in bumps if uid is not None]
+
+
+def mark_read(chat_id, player_id, user_id, up_to=None):
+    """
+    Сдвинуть водяной знак прочтения игрока ``player_id`` (пользователь ``user_id``)
+    до сообщения ``up_to`` (по умолчанию — последнего).
+
+    Одна строка ChatReadState, идемпотентно: если знак уже не меньше up_to, запись
+    в БД не выполняется. Счётчик пересчитывается в том же UPDATE как число чужих
+    сообщений новее знака, поэтому пришедшие параллельно сообщения не теряются.
+    Возвращает True, если знак сдвинулся.
+    """
+    if up_to is None:
+        up_to = Message.objects.filter(chat_id=chat_id).order_by("-id").values_list("id", flat=True).first()
+    if not up_to:
+        return False
+
+    state = ChatReadState.objects.filter(chat_id=chat_id, player_id=player_id).values_list("last_read_message_id", flat=True).first()
+    if state is None:
+        ensure_read_states(chat_id, [player_id])
+    elif state >= up_to:
+        return False
+
+    remaining = (
+        Message.objects
+        .filter(chat_id=OuterRef("chat_id"), id__gt=up_to)
+        .exclude(sender_id=OuterRef("player_id"))
+        .order_by()
+        .values("chat_id")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    moved = ChatReadState.objects.filter(
+        chat_id=chat_id, player_id=player_id, last_read_message_id__lt=up_to
+    ).update(
+        last_read_message_id=up_to,
+        unread_count=Coalesce(Subquery(remaining), 0),
+    )
+    if moved:
+        transaction.on_commit(lambda: invalidate_unread_cache([user_id]))
+        # остальные вкладки пользователя обновят бейдж
+        transaction.on_commit(lambda: publish_unread([user_id]))
+    return bool(moved)
+
+
+def unread_total(user_id):
+    """Общее число непрочитанных у пользователя — из кэша, при промахе из ChatReadState."""
+    key = _unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = (
+            ChatReadState.objects
+            .filter(player__user_id=user_id)
+            .aggregate(total=Sum("unread_count"))["total"]
+        ) or 0
+        cache.set(key, count, timeout=getattr(settings, "CHAT_UNREAD_CACHE_TTL", 600))
+    return max(count, 0)
+
+
+# ===== Список чатов (inbox) =====
+
+def chat_summaries(me):
+    """
+    Чаты игрока с последним сообщением и числом непрочитанных.
+
+    Один запрос (JOIN на ChatReadState + подзапросы по индексу (chat, created_at))
+    и один prefetch участников — независимо от количества чатов.
+    """
+    last = Message.objects.filter(chat=OuterRef("pk")).order_by("-created_at", "-id")
+    return (
+        Chat.objects
+        .filter(read_states__player=me)
+        .annotate(
+            unread=F("read_states__unread_count"),
+            last_at=Subquery(last.values("created_at")[:1]),
+            last_text=Subquery(last.values("text")[:1]),
+            last_sender_id=Subquery(last.values("sender_id")[:1]),
+        )
+        .prefetch_related(
+            Prefetch("participants", queryset=Player.objects.only("id", "first_name", "last_name", "photo"))
+        )
+        .order_by(F("last_at").desc(nulls_last=True), "-id")
+    )
+
+
+# ===== История сообщений (keyset-пагинация) =====
+
+def page_size(limit=None):
+    """Размер окна: по умолчанию CHAT_PAGE_SIZE, не больше CHAT_MAX_PAGE_SIZE."""
+    default = getattr(settings, "CHAT_PAGE_SIZE", 50)
+    maximum = getattr(settings, "CHAT_MAX_PAGE_SIZE", 100)
+    if not limit:
+        return default
+    return max(1, min(int(limit), maximum))
+
+
+def message_window(chat_id, before=None, after=None, limit=None, as_values=False):
+    """
+    Окно сообщений чата по курсору id (возвращается в хронологическом порядке).
+
+    * без курсоров — последние ``limit`` сообщений;
+    * ``before`` — более старые, чем сообщение ``before`` (прокрутка вверх);
+    * ``after`` — более новые, чем ``after`` (догрузка новых).
+
+    Возвращает ``(messages, has_more)``: для before/без курсора has_more значит
+    «есть ещё более старые», для after — «есть ещё более новые».
+    Запрос идёт по индексу chat_id (в SQLite индекс хранит rowid, т.е. это (chat, id)).
+    Когда живые сообщения кончаются, окно дополняется из ArchivedMessage (те же id).
+    ``as_values=True`` — dict-ы с полями serializers.MESSAGE_FIELDS вместо моделей;
+    такие окна сначала ищутся в кэше последних сообщений (chat/recent.py).
+    """
+    limit = page_size(limit)
+    if as_values:
+        cached = recent.window(chat_id, before, after, limit)
+        if cached is not None:
+            return cached
+
+    def rows_of(model):
+        qs = model.objects.filter(chat_id=chat_id)
+        if as_values:
+            return qs.values(*serializers.MESSAGE_FIELDS)
+        return qs.select_related("sender")
+
+    qs = rows_of(Message)
+
+    if after is not None:
+        rows = list(qs.filter(id__gt=after).order_by("id")[: limit + 1])
+        return rows[:limit], len(rows) > limit
+
+    if before is not None:
+        qs = qs.filter(id__lt=before)
+    rows = list(qs.order_by("-id")[: limit + 1])
+    if len(rows) <= limit:
+        # живая история кончилась — продолжаем из архива (он целиком старее)
+        older_than = (rows[-1]["id"] if as_values else rows[-1].id) if rows else before
+        archived = rows_of(ArchivedMessage)
+        if older_than is not None:
+            archived = archived.filter(id__lt=older_than)
+        rows += list(archived.order_by("-id")[: limit + 1 - len(rows)])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+# ===== Рассылка через channel layer (WebSocket и SSE) =====
+
+def message_event(message: Message, sender):
+    """Событие ``chat_message`` для группы ``chat_{id}``."""
+    card = serializers.sender_card(sender)
+    return {
+        "type": "chat_message",
+        "id": message.id,
+        "message": message.text,
+        "sender": card["name"],
+        "sender_photo": card["photo"],
+        "created_at": message.created_at.isoformat(),
+        "mine_user_id": sender.user_id,
+    }
+
+
+def publish_unread(user_ids):
+    """
+    Сообщить группам ``user_{id}``, что счётчик изменился. Сам счётчик считает
+    получатель — один раз на пачку событий (chat/notifications.py).
+    """
+    notifications.notify_users([uid for uid in user_ids if uid is not None])
+
+
+async def apublish_message(message: Message, sender, recipient_user_ids):
+    """
+    Разослать сохранённое сообщение: в группу ``chat_{id}`` (WebSocket и SSE)
+    и уведомления получателям в ``user_{id}``. Вызывать после коммита.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    await layer.group_send(f"chat_{message.chat_id}", message_event(message, sender))
+    await notifications.anotify_users(recipient_user_ids)
+
+
+def publish_message(message: Message, sender=None):
+    """Синхронная обёртка apublish_message (получатели — из кэша участников)."""
+    sender = sender or message.sender
+    recipients = other_member_user_ids(message.chat_id, sender.user_id)
+    async_to_sync(apublish_message)(message, sender, recipients)
+
+
+def post_message(chat_id, sender_id, text, broadcast=True):
+    """
+    Единый путь отправки сообщения для api_send и ChatConsumer.
+
+    INSERT и счётчики непрочитанных (post_save -> register_message) — в одной
+    транзакции; рассылка — только после коммита, так что клиент не получит
+    сообщение, которого нет в БД. ``broadcast=False`` — рассылает вызывающий
+    (ChatConsumer: await apublish_message прямо в event loop, без лишнего перехода
+    между потоками). Write-behind в ChatConsumer — отдельный путь: там рассылка до записи.
+    """
+    with transaction.atomic():
+        msg = Message.objects.create(chat_id=chat_id, sender_id=sender_id, text=text)
+        if broadcast:
+            transaction.on_commit(lambda: publish_message(msg))
+    return msg
@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from players.models import Player
+
+from .models import Chat, ChatReadState, Message
+from . import middleware, recent, serializers, services
+
+
+@receiver(post_save, sender=Message)
+def message_created(sender, instance, created, **kwargs):
+    if created:
+        services.register_message(instance)
+
+
+@receiver(m2m_changed, sender=Chat.participants.through)
+def participants_changed(sender, instance, action, pk_set, **kwargs):
+    # reverse: player.chats.add(...) — instance это Player, а pk_set — id чатов
+    reverse = kwargs.get("reverse", False)
+    if action == "pre_clear" and reverse:
+        # после clear() чаты игрока уже не узнать — запомним их для сброса кэша
+        instance._cleared_chat_ids = list(instance.chats.values_list("id", flat=True))
+    if action.startswith("post_"):
+        if not reverse:
+            chat_ids = [instance.pk]
+        elif pk_set is not None:
+            chat_ids = list(pk_set)
+        else:
+            chat_ids = getattr(instance, "_cleared_chat_ids", [])
+
+        def _invalidate():
+            for chat_id in chat_ids:
+                services.invalidate_members_cache(chat_id)
+        transaction.on_commit(_invalidate)
+    if action == "post_add" and pk_set:
+        if reverse:
+            services.ensure_read_state_pairs([(chat_id, instance.pk) for chat_id in pk_set])
+        else:
+            services.ensure_read_states(instance.pk, pk_set)
+    elif action in ("post_remove", "post_clear"):
+        if reverse:
+            states = ChatReadState.objects.filter(player_id=instance.pk)
+            if pk_set:
+                states = states.filter(chat_id__in=pk_set)
+        else:
+            states = ChatReadState.objects.filter(chat_id=instance.pk)
+            if pk_set:
+                states = states.filter(player_id__in=pk_set)
+        user_ids = list(states.values_list("player__user_id", flat=True))
+        states.delete()
+        transaction.on_commit(lambda: services.invalidate_unread_cache(user_ids))
+
+
+@receiver(pre_delete, sender=Chat)
+def chat_deleted(sender, instance, **kwargs):
+    # строки ChatReadState удалятся каскадом — сбросим суммы участников
+    user_ids = list(instance.participants.values_list("user_id", flat=True))
+    transaction.on_commit(lambda: services.invalidate_unread_cache(user_ids))
+
+
+@receiver(post_delete, sender=Chat)
+def chat_removed(sender, instance, **kwargs):
+    chat_id = instance.pk
+
+    def _cleanup():
+        services.invalidate_members_cache(chat_id)
+        recent.invalidate(chat_id)
+    transaction.on_commit(_cleanup)
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def player_changed(sender, instance, **kwargs):
+    # имя/аватар в сообщениях чата берутся из кэшированной карточки игрока
+    player_id = instance.pk
+    transaction.on_commit(lambda: serializers.invalidate_sender_card(player_id))
+
+
+# ===== Кэш аутентификации WebSocket (chat/middleware.py) =====
+
+@receiver(user_logged_out)
+def ws_auth_logout(sender, request, user, **kwargs):
+    session = getattr(request, "session", None)
+    middleware.forget_session(session.session_key if session is not None else None)
+
+
+# поля User, от которых зависит результат аутентификации сокета
+WS_AUTH_USER_FIELDS = {"is_active", "password"}
+
+
+@receiver(post_save, sender=User)
+def ws_auth_user_changed(sender, instance, update_fields=None, **kwargs):
+    # пароль, is_active — пересобрать закэшированный scope["user"]; вход
+    # (save(update_fields=["last_login"])) кэш, только что заполненный запросом, не трогает
+    if update_fields is not None and not WS_AUTH_USER_FIELDS.intersection(update_fields):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: middleware.invalidate_user(user_id))
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def ws_auth_player_changed(sender, instance, created=True, **kwargs):
+    # scope["player_id"] меняется только при появлении/удалении профиля
+    if created and instance.user_id:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: middleware.invalidate_user(user_id))
+
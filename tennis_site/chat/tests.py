@@ -1,3 +1,246 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
 
-# Create your tests here.
+from . import middleware, presence, services
+from .models import ChatReadState, Message
+
+
+def make_player(username):
+    return User.objects.create_user(username, password="pw").player_profile
+
+
+def unread(chat, player):
+    return ChatReadState.objects.get(chat=chat, player=player).unread_count
+
+
+class UnreadCounterTests(TestCase):
+    """Счётчики непрочитанных: отправка, mark_read и пачки сообщений."""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = make_player("alice")
+        self.bob = make_player("bob")
+        self.chat = services.get_or_create_direct_chat(self.alice, self.bob)
+
+    def send(self, sender, text="hi"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return services.post_message(self.chat.id, sender.id, text, broadcast=False)
+
+    def test_send_increments_only_recipient(self):
+        self.send(self.alice)
+        self.send(self.alice)
+
+        self.assertEqual(unread(self.chat, self.bob), 2)
+        self.assertEqual(unread(self.chat, self.alice), 0)
+        self.assertEqual(services.unread_total(self.bob.user_id), 2)
+
+    def test_send_bumps_cached_total(self):
+        self.assertEqual(services.unread_total(self.bob.user_id), 0)  # сумма в кэше
+
+        self.send(self.alice)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(services.unread_total(self.bob.user_id), 1)
+
+    def test_mark_read_resets_counter(self):
+        self.send(self.alice)
+        last = self.send(self.alice)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = services.mark_read(self.chat.id, self.bob.id, self.bob.user_id)
+
+        self.assertTrue(moved)
+        state = ChatReadState.objects.get(chat=self.chat, player=self.bob)
+        self.assertEqual(state.unread_count, 0)
+        self.assertEqual(state.last_read_message_id, last.id)
+        self.assertEqual(services.unread_total(self.bob.user_id), 0)
+
+    def test_mark_read_recomputes_messages_after_watermark(self):
+        first = self.send(self.alice)
+        self.send(self.bob)  # свои сообщения не считаются
+        self.send(self.alice)
+        self.send(self.alice)
+
+        services.mark_read(self.chat.id, self.bob.id, self.bob.user_id, up_to=first.id)
+
+        self.assertEqual(unread(self.chat, self.bob), 2)
+
+    def test_mark_read_is_idempotent(self):
+        msg = self.send(self.alice)
+        services.mark_read(self.chat.id, self.bob.id, self.bob.user_id, up_to=msg.id)
+
+        with self.assertNumQueries(1):
+            moved = services.mark_read(self.chat.id, self.bob.id, self.bob.user_id, up_to=msg.id)
+
+        self.assertFalse(moved)
+
+    def test_register_messages_counts_bulk_create(self):
+        carol = make_player("carol")
+        self.chat.participants.add(carol)
+        services.ensure_read_states(self.chat.id, [carol.id])
+        messages = Message.objects.bulk_create([
+            Message(chat=self.chat, sender=self.alice, text="1"),
+            Message(chat=self.chat, sender=self.alice, text="2"),
+            Message(chat=self.chat, sender=self.bob, text="3"),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipients = services.register_messages(messages)
+
+        self.assertEqual(unread(self.chat, self.alice), 1)
+        self.assertEqual(unread(self.chat, self.bob), 2)
+        self.assertEqual(unread(self.chat, carol), 3)
+        self.assertCountEqual(recipients, [self.alice.user_id, self.bob.user_id, carol.user_id])
+
+    def test_reverse_add_creates_read_state(self):
+        carol = make_player("carol")
+
+        carol.chats.add(self.chat)  # со стороны игрока: pk_set — id чатов
+        self.send(self.alice)
+
+        self.assertEqual(unread(self.chat, carol), 1)
+        self.assertFalse(ChatReadState.objects.filter(chat_id=carol.id, player_id=self.chat.id).exists())
+
+    def test_reverse_remove_deletes_read_state(self):
+        self.bob.chats.remove(self.chat)
+
+        self.assertFalse(ChatReadState.objects.filter(chat=self.chat, player=self.bob).exists())
+        self.assertTrue(ChatReadState.objects.filter(chat=self.chat, player=self.alice).exists())
+
+
+class MemberAccessTests(TestCase):
+    """Доступ к API чата по кэшу участников меняется сразу, с любой стороны m2m."""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = make_player("alice")
+        self.bob = make_player("bob")
+        self.carol = make_player("carol")
+        self.chat = services.get_or_create_direct_chat(self.alice, self.bob)
+
+    def status_for(self, player):
+        self.client.force_login(player.user)
+        return self.client.get(reverse("chat:api_messages", args=[self.chat.id])).status_code
+
+    def test_reverse_add_grants_access(self):
+        self.assertEqual(self.status_for(self.carol), 403)  # участники теперь в кэше
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carol.chats.add(self.chat)
+
+        self.assertEqual(self.status_for(self.carol), 200)
+
+    def test_reverse_remove_revokes_access(self):
+        self.assertEqual(self.status_for(self.bob), 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.chats.remove(self.chat)
+
+        self.assertEqual(self.status_for(self.bob), 403)
+
+    def test_reverse_clear_revokes_access(self):
+        self.assertEqual(self.status_for(self.bob), 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bob.chats.clear()
+
+        self.assertEqual(self.status_for(self.bob), 403)
+
+
+class WebSocketAuthCacheTests(TestCase):
+    """Сброс кэша аутентификации сокета (chat/middleware.py) при изменении User."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", password="pw")
+
+    def version_after(self, **save_kwargs):
+        before = cache.get(middleware._version_key(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(**save_kwargs)
+        return before, cache.get(middleware._version_key(self.user.pk))
+
+    def test_last_login_keeps_cache(self):
+        before, after = self.version_after(update_fields=["last_login"])
+        self.assertEqual(before, after)
+
+    def test_auth_fields_invalidate(self):
+        for save_kwargs in ({}, {"update_fields": ["password"]}, {"update_fields": ["is_active"]}):
+            with self.subTest(**save_kwargs):
+                before, after = self.version_after(**save_kwargs)
+                self.assertNotEqual(before, after)
+
+
+class PresenceTests(TestCase):
+    """Async-версии presence (потребители, SSE) ведут тот же счётчик, что и sync."""
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_async_connect_disconnect(self):
+        self.assertTrue(await presence.aconnect(7))
+        self.assertFalse(await presence.aconnect(7))  # вторая вкладка
+        await presence.aheartbeat(7)
+        self.assertTrue(presence.status(7)["online"])
+
+        self.assertFalse(await presence.adisconnect(7))
+        self.assertTrue(await presence.adisconnect(7))
+        status = await presence.astatus(7)
+        self.assertFalse(status["online"])
+        self.assertIsNotNone(status["last_seen"])
+
+    async def test_async_typing_throttle(self):
+        self.assertTrue(await presence.atyping_allowed(1, 7))
+        self.assertFalse(await presence.atyping_allowed(1, 7))
+
+
+class ReadStateMigrationTests(TransactionTestCase):
+    """Миграции 0004/0005: перенос is_read в ChatReadState и водяной знак прочтения."""
+
+    before = [("chat", "0003_message_chat_messag_chat_id_0c7b25_idx_and_more")]
+    after = [("chat", "0005_read_watermark")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_backfill_existing_unread_messages(self):
+        alice = make_player("alice")
+        bob = make_player("bob")
+
+        apps = self.migrate(self.before)
+        Chat = apps.get_model("chat", "Chat")
+        Message = apps.get_model("chat", "Message")
+        chat = Chat.objects.create()
+        chat.participants.add(alice.id, bob.id)
+        Message.objects.create(chat=chat, sender_id=alice.id, text="1", is_read=True)
+        m2 = Message.objects.create(chat=chat, sender_id=bob.id, text="2", is_read=True)
+        Message.objects.create(chat=chat, sender_id=alice.id, text="3", is_read=False)
+        m4 = Message.objects.create(chat=chat, sender_id=alice.id, text="4", is_read=False)
+        empty = Chat.objects.create()
+        empty.participants.add(alice.id, bob.id)
+
+        apps = self.migrate(self.after)
+        ReadState = apps.get_model("chat", "ChatReadState")
+
+        bob_state = ReadState.objects.get(chat_id=chat.id, player_id=bob.id)
+        self.assertEqual(bob_state.unread_count, 2)
+        self.assertEqual(bob_state.last_read_message_id, m2.id)
+        alice_state = ReadState.objects.get(chat_id=chat.id, player_id=alice.id)
+        self.assertEqual(alice_state.unread_count, 0)
+        self.assertEqual(alice_state.last_read_message_id, m4.id)
+        self.assertEqual(
+            list(ReadState.objects.filter(chat_id=empty.id).values_list("unread_count", "last_read_message_id")),
+            [(0, 0), (0, 0)],
+        )
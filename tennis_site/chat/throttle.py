@@ -0,0 +1,87 @@
+"""
+Ограничение входящего потока для WebSocket-соединений чата.
+
+* ``TokenBucket`` — классический token bucket (rate токенов/сек., запас burst);
+* ``user_bucket`` — общий bucket пользователя на все его соединения в процессе
+  (и для HTTP api_send), чтобы несколько вкладок не обходили лимит.
+
+Buckets живут в памяти процесса: при N ASGI-воркерах соединения одного
+пользователя могут попасть в разные процессы, и фактический лимит на него —
+до N × CHAT_USER_MESSAGE_RATE (запас — N × CHAT_USER_MESSAGE_BURST).
+
+Исходящий поток не ограничивается: daphne пишет кадр в транспорт, не дожидаясь
+клиента, и потребителю не видно, сколько данных застряло в буфере сокета.
+
+Все лимиты — в settings (CHAT_WS_* / CHAT_USER_*), отказы считаются в chat.metrics.
+"""
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import metrics
+
+# WebSocket close codes (4000–4999 — для приложений)
+CLOSE_RATE_LIMITED = 4029
+CLOSE_TOO_BIG = 1009
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def consume(self, n=1):
+        """Взять n токенов; False — лимит исчерпан."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+
+def frame_bucket():
+    """Bucket входящих кадров одного соединения."""
+    return TokenBucket(
+        getattr(settings, "CHAT_WS_FRAME_RATE", 10),
+        getattr(settings, "CHAT_WS_FRAME_BURST", 20),
+    )
+
+
+_user_buckets = OrderedDict()
+_MAX_USER_BUCKETS = 10000
+
+
+def user_bucket(user_id):
+    """Bucket сообщений пользователя (LRU, чтобы словарь не рос бесконечно)."""
+    bucket = _user_buckets.get(user_id)
+    if bucket is None:
+        bucket = _user_buckets[user_id] = TokenBucket(
+            getattr(settings, "CHAT_USER_MESSAGE_RATE", 2),
+            getattr(settings, "CHAT_USER_MESSAGE_BURST", 10),
+        )
+        if len(_user_buckets) > _MAX_USER_BUCKETS:
+            _user_buckets.popitem(last=False)
+    else:
+        _user_buckets.move_to_end(user_id)
+    return bucket
+
+
+def allow_user_message(user_id):
+    if user_bucket(user_id).consume():
+        return True
+    metrics.incr("throttle.user_dropped")
+    return False
+
+
+def max_message_length():
+    return getattr(settings, "CHAT_MAX_MESSAGE_LENGTH", 4000)
+
+
+def max_frame_bytes():
+    return getattr(settings, "CHAT_WS_MAX_FRAME_BYTES", 16384)
+
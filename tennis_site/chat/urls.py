@@ -11,8 +11,12 @@ urlpatterns = [
     # API
     path("api/send/<int:chat_id>/", views.api_send, name="api_send"),
     path("api/messages/<int:chat_id>/", views.api_messages, name="api_messages"),
+    path("api/typing/<int:chat_id>/", views.api_typing, name="api_typing"),
     path("api/mark_read/<int:chat_id>/", views.api_mark_read, name="api_mark_read"),
     path("api/unread_count/", views.api_unread_count, name="api_unread_count"),
     path("api/unread_per_chat/", views.api_unread_per_chat, name="api_unread_per_chat"),
+    path("api/search/", views.api_search, name="api_search"),
+    path("api/events/", views.api_events, name="api_events"),
+    path("api/metrics/", views.api_metrics, name="api_metrics"),
     path("<int:chat_id>/delete/", views.delete_chat, name="delete_chat"),
 ]
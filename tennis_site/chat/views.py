@@ -1,11 +1,18 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseForbidden
-from django.db.models import Max
-from django.utils.dateparse import parse_datetime
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.contrib import messages
+from django.utils.text import Truncator
 
-from .models import Chat, Message
+from . import metrics, notifications, presence, search, serializers, services, throttle
+from .models import Chat
 from players.models import Player
 
 
@@ -21,38 +28,58 @@ def _abs_photo_url(request, player: Player):
     return None
 
 
+def _int_param(request, name):
+    """Целочисленный GET-параметр; None если не передан. ValueError если мусор."""
+    value = request.GET.get(name)
+    if value in (None, ""):
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(name)
+    return value
+
+
 def _ensure_participant_or_403(request, chat: Chat):
-    """Проверить, что текущий пользователь — участник чата."""
-    me = request.user.player_profile
-    if not chat.participants.filter(id=me.id).exists():
+    """Проверить, что текущий пользователь — участник чата (по кэшу участников)."""
+    if not services.is_member(chat.id, request.user.id):
         return HttpResponseForbidden("Not a chat participant")
     return None
 
 
+def _member_player_id(request, chat_id):
+    """
+    player_id текущего пользователя в чате (по кэшу участников, без загрузки
+    Chat и Player) -> ``(player_id, None)``; иначе ``(None, ответ 403)``.
+    Http404, если чата нет.
+    """
+    player_id = services.member_player_id(chat_id, request.user.id)
+    if player_id is not None:
+        return player_id, None
+    if services.chat_members(chat_id) is None:
+        raise Http404("Chat not found")
+    return None, HttpResponseForbidden("Not a chat participant")
+
+
 # ------------------- Представления -------------------
 
 @login_required
 def inbox(request):
     """Список чатов текущего пользователя."""
     me = request.user.player_profile
-    chats = (
-        Chat.objects.filter(participants=me)
-        .prefetch_related("participants")
-        .annotate(last_at=Max("messages__created_at"))
-        .order_by("-last_at", "-id")
-    )
 
     data = []
-    for ch in chats:
+    for ch in services.chat_summaries(me):
         other = ch.other_for(me)
-        last = ch.last_message()
-        unread = ch.messages.filter(is_read=False).exclude(sender=me).count()
+        preview = Truncator(ch.last_text or "").chars(60)
+        if preview and ch.last_sender_id == me.id:
+            preview = f"Вы: {preview}"
         data.append({
             "chat": ch,
             "other": other,
             "other_photo": _abs_photo_url(request, other) if other else None,
-            "last_message": last,
-            "unread": unread,
+            "last_at": ch.last_at,
+            "last_message_preview": preview,
+            "unread_count": ch.unread,
         })
 
     return render(request, "chat/inbox.html", {"items": data})
@@ -64,19 +91,15 @@ def chat_with(request, player_id):
     me = request.user.player_profile
     other = get_object_or_404(Player, pk=player_id)
 
-    chat = (
-        Chat.objects.filter(participants=me)
-        .filter(participants=other)
-        .first()
-    )
-    if not chat:
-        chat = Chat.objects.create()
-        chat.participants.add(me, other)
+    chat = services.get_or_create_direct_chat(me, other)
 
-    chat_messages = chat.messages.select_related("sender").order_by("created_at")
+    # только последнее окно; более старые сообщения догружаются через api_messages?before=
+    rows, has_more = services.message_window(chat.id, as_values=True)
+    chat_messages = serializers.serialize_messages(rows, me.id, iso_dates=False)
 
-    # все входящие помечаем прочитанными
-    chat.messages.filter(is_read=False).exclude(sender=me).update(is_read=True)
+    # всё показанное — прочитано
+    if chat_messages:
+        services.mark_read(chat.id, me.id, request.user.id, up_to=chat_messages[-1]["id"])
 
     return render(
         request,
@@ -84,8 +107,10 @@ def chat_with(request, player_id):
         {
             "chat": chat,
             "chat_messages": chat_messages,
+            "has_more": has_more,
             "other": other,
             "other_photo": _abs_photo_url(request, other),
+            "other_presence": presence.status(other.user_id),
         },
     )
 
@@ -115,66 +140,74 @@ def api_send(request, chat_id):
     if request.method != "POST":
         return JsonResponse({"error": "bad request"}, status=400)
 
-    chat = get_object_or_404(Chat, id=chat_id)
-    forbid = _ensure_participant_or_403(request, chat)
+    me_id, forbid = _member_player_id(request, chat_id)
     if forbid:
         return forbid
 
-    import json
     payload = json.loads(request.body or "{}")
     text = (payload.get("text") or "").strip()
     if not text:
         return JsonResponse({"error": "empty"}, status=400)
+    if len(text) > throttle.max_message_length():
+        return JsonResponse({"error": "too long"}, status=400)
+    if not throttle.allow_user_message(request.user.id):
+        return JsonResponse({"error": "rate limited"}, status=429)
 
-    me = request.user.player_profile
-    msg = Message.objects.create(chat=chat, sender=me, text=text)
+    # остальные вкладки/участники получат сообщение через WebSocket/SSE
+    msg = services.post_message(chat_id, me_id, text)
 
+    row = {"id": msg.id, "text": msg.text, "sender_id": me_id, "created_at": msg.created_at}
     return JsonResponse(
-        {
-            "message": {
-                "id": msg.id,
-                "text": msg.text,
-                "sender_name": msg.sender.first_name,
-                "sender_photo": _abs_photo_url(request, msg.sender),
-                "mine": True,
-                "created_at": msg.created_at.isoformat(),
-            }
-        },
+        {"message": serializers.serialize_messages([row], me_id, absolute=request.build_absolute_uri)[0]},
         status=201,
     )
 
 
 @login_required
 def api_messages(request, chat_id):
-    """GET: получить сообщения (с фильтром по after)."""
-    chat = get_object_or_404(Chat, id=chat_id)
-    forbid = _ensure_participant_or_403(request, chat)
+    """
+    GET: окно сообщений по курсору.
+    ?before=<id> — более старые (история), ?after=<id> — новые, ?limit= — размер окна.
+    """
+    me_id, forbid = _member_player_id(request, chat_id)
     if forbid:
         return forbid
 
-    after = request.GET.get("after")
-    qs = chat.messages.select_related("sender").order_by("created_at")
-    if after:
-        after_dt = parse_datetime(after)
-        if after_dt:
-            qs = qs.filter(created_at__gt=after_dt)
+    try:
+        before = _int_param(request, "before")
+        after = _int_param(request, "after")
+        limit = _int_param(request, "limit")
+    except ValueError:
+        return JsonResponse({"error": "bad cursor"}, status=400)
 
-    me = request.user.player_profile
-    msgs = [
-        {
-            "id": m.id,
-            "text": m.text,
-            "sender_name": m.sender.first_name,
-            "sender_photo": _abs_photo_url(request, m.sender),
-            "mine": (m.sender_id == me.id),
-            "created_at": m.created_at.isoformat(),
-        }
-        for m in qs
-    ]
+    window, has_more = services.message_window(chat_id, before=before, after=after, limit=limit, as_values=True)
+    msgs = serializers.serialize_messages(window, me_id, absolute=request.build_absolute_uri)
+
+    # история (before) не двигает прочтение; для новых — до последнего отданного
+    if before is None and window:
+        services.mark_read(chat_id, me_id, request.user.id, up_to=window[-1]["id"])
 
-    chat.messages.filter(is_read=False).exclude(sender=me).update(is_read=True)
+    return JsonResponse({
+        "messages": msgs,
+        "has_more": has_more,
+        "next_before": msgs[0]["id"] if msgs and after is None else None,
+    })
 
-    return JsonResponse({"messages": msgs})
+
+@login_required
+def api_typing(request, chat_id):
+    """POST: «печатает…». Троттлится на сервере, лишние вызовы ничего не рассылают."""
+    if request.method != "POST":
+        return JsonResponse({"error": "bad request"}, status=400)
+    if not services.is_member(chat_id, request.user.id):
+        return HttpResponseForbidden("Not a chat participant")
+
+    sent = presence.typing_allowed(chat_id, request.user.id)
+    if sent:
+        layer = get_channel_layer()
+        if layer is not None:
+            async_to_sync(layer.group_send)(f"chat_{chat_id}", presence.typing_event(request.user.id))
+    return JsonResponse({"ok": True, "sent": sent})
 
 
 @login_required
@@ -183,44 +216,166 @@ def api_mark_read(request, chat_id):
     if request.method != "POST":
         return JsonResponse({"error": "bad request"}, status=400)
 
-    chat = get_object_or_404(Chat, id=chat_id)
-    forbid = _ensure_participant_or_403(request, chat)
+    me_id, forbid = _member_player_id(request, chat_id)
     if forbid:
         return forbid
 
-    me = request.user.player_profile
-    chat.messages.filter(is_read=False).exclude(sender=me).update(is_read=True)
+    services.mark_read(chat_id, me_id, request.user.id)
     return JsonResponse({"ok": True})
 
 
 @login_required
 def api_unread_count(request):
     """Общий счётчик непрочитанных сообщений."""
-    me = request.user.player_profile
-    count = (
-        Message.objects
-        .filter(chat__participants=me, is_read=False)
-        .exclude(sender=me)
-        .count()
-    )
-    return JsonResponse({"count": count})
+    return JsonResponse({"count": services.unread_total(request.user.id)})
 
 
 @login_required
 def api_unread_per_chat(request):
     """Счётчик непрочитанных по каждому чату."""
     me = request.user.player_profile
-    chats = Chat.objects.filter(participants=me).distinct().prefetch_related("participants")
 
     data = []
-    for chat in chats:
+    for chat in services.chat_summaries(me):
         other = chat.other_for(me)
-        unread = chat.messages.filter(is_read=False).exclude(sender=me).count()
         data.append({
             "chat_id": chat.id,
             "other_name": f"{other.first_name} {other.last_name}" if other else "Без имени",
             "other_photo": _abs_photo_url(request, other) if other else None,
-            "unread": unread,
+            "unread": chat.unread,
         })
 
     return JsonResponse({"chats": data})
+
+
+@login_required
+def api_search(request):
+    """
+    GET: поиск по сообщениям своих чатов.
+    ?q=<текст>&page=<n> — лучшие совпадения первыми, со сниппетами (<mark>…</mark>).
+    """
+    query = (request.GET.get("q") or "").strip()
+    try:
+        page = _int_param(request, "page") or 1
+    except ValueError:
+        return JsonResponse({"error": "bad page"}, status=400)
+    if not query:
+        return JsonResponse({"results": [], "page": page, "has_more": False})
+
+    me = request.user.player_profile
+    with metrics.timer("chat.search"):
+        hits, has_more = search.search_messages(me, query, page=page)
+
+    results = [
+        {
+            "id": m.id,
+            "chat_id": m.chat_id,
+            "snippet": snippet,
+            "sender_name": m.sender.first_name,
+            "mine": (m.sender_id == me.id),
+            "created_at": m.created_at.isoformat(),
+        }
+        for m, snippet in hits
+    ]
+    return JsonResponse({"results": results, "page": page, "has_more": has_more})
+
+
+# ------------------- Server-Sent Events -------------------
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _event_stream(user_id, chat_id):
+    """Поток событий групп user_{id} (счётчик) и chat_{id} (сообщения открытого чата)."""
+    layer = get_channel_layer()
+    channel = await layer.new_channel()
+    groups = [f"user_{user_id}"] + ([f"chat_{chat_id}"] if chat_id else [])
+    keepalive = getattr(settings, "CHAT_EVENTS_KEEPALIVE", 25)
+
+    for group in groups:
+        await layer.group_add(group, channel)
+    if await presence.aconnect(user_id) and chat_id:
+        await layer.group_send(f"chat_{chat_id}", await presence.apresence_event(user_id))
+    loop = asyncio.get_running_loop()
+    beat_at = loop.time()
+    batch, flush_at = notifications.NotifyBatch(), None  # debounce событий notify
+    try:
+        yield "retry: 3000\n\n"
+        count = await sync_to_async(services.unread_total)(user_id)
+        yield _sse("unread", {"count": count})
+
+        while True:
+            if loop.time() - beat_at >= keepalive:
+                await presence.aheartbeat(user_id)
+                beat_at = loop.time()
+            if flush_at is not None and loop.time() >= flush_at:
+                count = await sync_to_async(services.unread_total)(user_id) if batch.unread else None
+                payload = batch.payload(count)
+                if count is not None:
+                    yield _sse("unread", {"count": count})
+                if "events" in payload:
+                    yield _sse("notifications", payload["events"])
+                batch, flush_at = notifications.NotifyBatch(), None
+
+            timeout = keepalive if flush_at is None else max(flush_at - loop.time(), 0)
+            try:
+                event = await asyncio.wait_for(layer.receive(channel), timeout=timeout)
+            except asyncio.TimeoutError:
+                if flush_at is None:
+                    yield ": keepalive\n\n"
+                continue
+
+            kind = event.get("type")
+            if kind in ("chat_typing", "chat_presence"):
+                if event["user_id"] != user_id:
+                    payload = {k: v for k, v in event.items() if k != "type"}
+                    yield _sse("typing" if kind == "chat_typing" else "presence", payload)
+            elif kind == "notify":
+                batch.add(event)
+                if flush_at is None:
+                    flush_at = loop.time() + notifications.debounce_window()
+            elif kind == "chat_message":
+                yield _sse("message", {
+                    "id": event.get("id"),
+                    "text": event["message"],
+                    "sender_name": event["sender"],
+                    "sender_photo": event["sender_photo"],
+                    "mine": event.get("mine_user_id") == user_id,
+                    "created_at": event["created_at"],
+                })
+    finally:
+        # клиент отключился — Django отменяет генератор, выходим из групп
+        for group in groups:
+            await layer.group_discard(group, channel)
+        if await presence.adisconnect(user_id) and chat_id:
+            await layer.group_send(f"chat_{chat_id}", await presence.apresence_event(user_id))
+
+
+async def api_events(request):
+    """
+    GET: Server-Sent Events вместо опроса api_unread_count/api_messages.
+    ?chat=<id> — дополнительно присылать новые сообщения этого чата.
+    Работает только под ASGI (daphne): соединение висит, пока открыта вкладка.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "auth required"}, status=401)
+
+    chat_id = request.GET.get("chat") or None
+    if chat_id is not None:
+        if not chat_id.isdigit():
+            return JsonResponse({"error": "bad chat"}, status=400)
+        if not await sync_to_async(services.is_member)(int(chat_id), user.id):
+            return HttpResponseForbidden("Not a chat participant")
+
+    response = StreamingHttpResponse(_event_stream(user.id, chat_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: не буферизовать поток
+    return response
+
+
+@staff_member_required
+def api_metrics(request):
+    """Метрики чата (channel layer, backpressure и т.д.) — только для staff."""
+    return JsonResponse({"metrics": metrics.snapshot()})
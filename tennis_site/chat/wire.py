@@ -0,0 +1,116 @@
+"""
+Формат кадров WebSocket чата.
+
+По умолчанию — JSON-строка на каждое событие (как раньше). Клиент может запросить
+подпротокол ``chat.msgpack.v1`` (``new WebSocket(url, ["chat.msgpack.v1"])``), тогда:
+
+* сервер шлёт бинарные кадры msgpack; кадр — массив событий, накопленных за
+  CHAT_WS_BATCH_WINDOW секунд (не больше CHAT_WS_BATCH_MAX);
+* событие — массив ``[kind, значения полей...]`` в порядке SCHEMAS, без имён ключей;
+  у неизвестных видов — ``[kind, {map}]``;
+* клиент может слать как JSON-текст, так и msgpack-map с теми же ключами.
+
+Без установленного msgpack подпротокол не принимается, клиент получает JSON.
+"""
+import asyncio
+import json
+
+from django.conf import settings
+
+from . import metrics
+
+try:
+    import msgpack
+except ImportError:  # msgpack приходит вместе с channels_redis, но не обязателен
+    msgpack = None
+
+SUBPROTOCOL = "chat.msgpack.v1"
+
+# порядок полей в бинарном событии
+SCHEMAS = {
+    "message": ("id", "message", "sender", "sender_photo", "created_at", "temp_id"),
+    "notify": ("unread_count", "events"),
+    "typing": ("user_id",),
+    "presence": ("user_id", "online", "last_seen"),
+    "error": ("error",),
+    "resumed": ("replayed", "last_id"),
+    "resync": (),
+}
+
+
+def pack_event(kind, payload):
+    schema = SCHEMAS.get(kind)
+    if schema is None:
+        return [kind, payload]
+    return [kind, *(payload.get(key) for key in schema)]
+
+
+def encode_batch(events):
+    """Список уже упакованных событий -> один бинарный кадр."""
+    return msgpack.packb(events, use_bin_type=True)
+
+
+def decode_frame(text_data=None, bytes_data=None):
+    """Входящий кадр (JSON-текст или msgpack) -> dict. ValueError, если это не объект."""
+    if bytes_data is not None:
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        try:
+            data = msgpack.unpackb(bytes_data, raw=False)
+        except Exception as exc:
+            raise ValueError(str(exc)) from exc
+    else:
+        data = json.loads(text_data or "{}")
+    if not isinstance(data, dict):
+        raise ValueError("frame must be an object")
+    return data
+
+
+class WireProtocolMixin:
+    """
+    Для AsyncWebsocketConsumer: accept_negotiated() выбирает формат по
+    Sec-WebSocket-Protocol, send_event() отправляет событие в выбранном формате.
+    """
+
+    binary = False
+    _pending = None
+    _flush_timer = None
+
+    async def accept_negotiated(self):
+        if msgpack is not None and SUBPROTOCOL in self.scope.get("subprotocols", ()):
+            self.binary = True
+            self._pending = []
+            metrics.incr("ws.msgpack_connections")
+            await self.accept(subprotocol=SUBPROTOCOL)
+        else:
+            await self.accept()
+
+    async def send_event(self, kind, payload):
+        if not self.binary:
+            await self.send(text_data=json.dumps(payload))
+            return
+        self._pending.append(pack_event(kind, payload))
+        if len(self._pending) >= getattr(settings, "CHAT_WS_BATCH_MAX", 32):
+            await self.flush_events()
+        elif self._flush_timer is None:
+            window = getattr(settings, "CHAT_WS_BATCH_WINDOW", 0.02)
+            self._flush_timer = asyncio.get_running_loop().call_later(
+                window, lambda: asyncio.ensure_future(self.flush_events())
+            )
+
+    async def flush_events(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        metrics.incr("ws.msgpack_frames")
+        metrics.incr("ws.msgpack_events", len(batch))
+        await self.send(bytes_data=encode_batch(batch))
+
+    async def websocket_disconnect(self, message):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        await super().websocket_disconnect(message)
@@ -0,0 +1,139 @@
+"""
+Write-behind для сообщений чата (включается CHAT_WRITE_BEHIND=True).
+
+ChatConsumer рассылает сообщение сразу, а в БД оно попадает пачкой через
+bulk_create: по таймеру (CHAT_WRITE_BEHIND_INTERVAL) или когда набралось
+CHAT_WRITE_BEHIND_BATCH сообщений. Очередь ограничена CHAT_WRITE_BEHIND_MAX_PENDING:
+при переполнении отправитель ждёт синхронного сброса (backpressure).
+Хвост сбрасывается при отключении сокета и при завершении процесса (atexit).
+
+Ошибки сброса не теряют пачку целиком:
+* сообщения удалённых за это время чатов (или отправителей) отбрасываются
+  до bulk_create — метрика ``writebehind.dropped``;
+* OperationalError (например, «database is locked») — пачка возвращается в
+  начало очереди и сброс повторяется по таймеру (``writebehind.flush_failed``);
+* прочие ошибки логируются и считаются там же, пачка отбрасывается.
+
+Ограничение режима: в момент рассылки у сообщения ещё нет id — событие несёт
+``id: null`` и ``temp_id`` (для дедупликации на клиенте). Поэтому досылка по
+``?last_seen_id`` после переподключения (ChatConsumer._replay) в этом режиме
+не работает: клиент не знает id сообщений, полученных вживую.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+from players.models import Player
+
+from . import metrics, notifications, services
+from .models import Chat, Message
+
+logger = logging.getLogger(__name__)
+
+
+def enabled():
+    return getattr(settings, "CHAT_WRITE_BEHIND", False)
+
+
+class MessageWriteBuffer:
+    """Буфер несохранённых Message одного процесса."""
+
+    def __init__(self, interval=0.2, batch_size=50, max_pending=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.pending = []
+        self._timer = None
+        self._lock = threading.Lock()  # сброс из event loop и из atexit
+
+    async def add(self, message: Message):
+        if len(self.pending) >= self.max_pending:
+            metrics.incr("writebehind.backpressure")
+            await self.flush()
+
+        self.pending.append(message)
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        else:
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.interval, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        """Сбросить очередь; исключения не пробрасываются (см. docstring модуля)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        try:
+            user_ids = await database_sync_to_async(self._persist)(batch)
+        except OperationalError:
+            logger.exception("write-behind: сброс %s сообщений не удался, повторим", len(batch))
+            metrics.incr("writebehind.flush_failed")
+            self.pending[:0] = batch
+            self._schedule()
+            return
+        except Exception:
+            logger.exception("write-behind: пачка из %s сообщений отброшена", len(batch))
+            metrics.incr("writebehind.flush_failed")
+            return
+
+        # счётчики обновлены вместе с INSERT — теперь можно уведомить получателей
+        await notifications.anotify_users(user_ids)
+
+    def flush_sync(self):
+        """Сбросить остаток без event loop (завершение процесса)."""
+        batch, self.pending = self.pending, []
+        if batch:
+            try:
+                self._persist(batch)
+            except Exception:
+                logger.exception("write-behind: при завершении потеряно %s сообщений", len(batch))
+                metrics.incr("writebehind.flush_failed")
+
+    def _persist(self, batch):
+        with self._lock, metrics.timer("writebehind.flush"):
+            with transaction.atomic():
+                batch = self._alive(batch)
+                created = Message.objects.bulk_create(batch)
+                user_ids = services.register_messages(created)
+        metrics.incr("writebehind.messages", len(batch))
+        metrics.incr("writebehind.batches")
+        return user_ids
+
+    @staticmethod
+    def _alive(batch):
+        """Без сообщений, чьи чат или отправитель удалены после рассылки."""
+        chats = set(Chat.objects.filter(id__in={m.chat_id for m in batch}).values_list("id", flat=True))
+        senders = set(Player.objects.filter(id__in={m.sender_id for m in batch}).values_list("id", flat=True))
+        alive = [m for m in batch if m.chat_id in chats and m.sender_id in senders]
+        if len(alive) < len(batch):
+            logger.warning("write-behind: отброшено %s сообщений удалённых чатов", len(batch) - len(alive))
+            metrics.incr("writebehind.dropped", len(batch) - len(alive))
+        return alive
+
+
+_buffer = None
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = MessageWriteBuffer(
+            interval=getattr(settings, "CHAT_WRITE_BEHIND_INTERVAL", 0.2),
+            batch_size=getattr(settings, "CHAT_WRITE_BEHIND_BATCH", 50),
+            max_pending=getattr(settings, "CHAT_WRITE_BEHIND_MAX_PENDING", 500),
+        )
+        atexit.register(_buffer.flush_sync)
+    return _buffer
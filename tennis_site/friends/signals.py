@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from chat.notifications import notify_users
+
+from .models import Friendship
+
+
+# уведомления идут в тот же канал user_{id}, что и счётчик чата
+@receiver(post_save, sender=Friendship)
+def friendship_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        user_id, kind = instance.to_player_id, "friend_request"
+        data = {"friendship_id": instance.pk, "from_user_id": instance.from_player_id}
+    elif instance.is_accepted and (update_fields is None or "is_accepted" in update_fields):
+        user_id, kind = instance.from_player_id, "friend_accepted"
+        data = {"friendship_id": instance.pk, "by_user_id": instance.to_player_id}
+    else:
+        return
+    transaction.on_commit(lambda: notify_users([user_id], kind, data))
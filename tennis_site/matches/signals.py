@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from chat.notifications import notify_users
+from players.models import Player
+
+from .models import Match
+
+
+@receiver(pre_save, sender=Match)
+def match_remember_opponent(sender, instance, **kwargs):
+    # прежний соперник нужен в post_save, чтобы отличить вход/выход из матча от правки
+    instance._previous_player2_id = (
+        Match.objects.filter(pk=instance.pk).values_list("player2_id", flat=True).first()
+        if instance.pk else None
+    )
+
+
+# уведомления идут в тот же канал user_{id}, что и счётчик чата
+@receiver(post_save, sender=Match)
+def match_saved(sender, instance, created, **kwargs):
+    before, after = getattr(instance, "_previous_player2_id", None), instance.player2_id
+    if before == after:
+        return
+    if created:
+        kind, player_id = "match_invited", after            # соперник указан при создании
+    elif after:
+        kind, player_id = "match_joined", instance.player1_id
+    else:
+        kind, player_id = "match_left", instance.player1_id
+    data = {"match_id": instance.pk, "opponent_id": after or before}
+
+    def _send():
+        user_id = Player.objects.filter(id=player_id).values_list("user_id", flat=True).first()
+        notify_users([user_id], kind, data)
+    transaction.on_commit(_send)
@@ -1,3 +1,42 @@
+import datetime
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from players.tests import make_players
+
+from .models import Match
+
+
+class MatchNameSearchTests(TestCase):
+    """Фильтр списка матчей по имени игрока (players/search.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        players = make_players()
+        when = {"date": datetime.date(2026, 5, 1), "time": datetime.time(10)}
+        cls.first = Match.objects.create(
+            player1=players["Иванова"], player2=players["Хабибуллин"], location="Алматы", **when
+        )
+        cls.second = Match.objects.create(
+            player1=players["Щукина"], player2=players["Жумабаев"], location="Астана", **when
+        )
+        cls.user = User.objects.create_user("viewer", password="pw")
 
-# Create your tests here.
+    def test_match_list_by_player_name(self):
+        self.client.force_login(self.user)
+        cases = {
+            "Юлия": {self.first},
+            "Иванова Юлия": {self.first},
+            "Алексей Хабибуллин": {self.first},
+            "Мария Щук": {self.second},
+            "Dias Жумабаев": {self.second},
+            "Астана": {self.second},
+            "Петров": set(),
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                response = self.client.get(reverse("match_list"), {"q": query})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(set(response.context["matches"]), expected)
@@ -3,6 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.forms import modelform_factory
 from django.db.models import Q
+from players import search as player_search
 from .models import Match
 
 # Если у тебя есть своя форма — импортируй. Иначе создаём на лету.
@@ -28,10 +29,11 @@ def match_list(request):
     date_to = request.GET.get("date_to")
 
     if q:
+        # имена — через индекс players/search.py (транслитерация, префиксы)
         qs = qs.filter(
             Q(location__icontains=q)
-            | Q(player1__first_name__icontains=q) | Q(player1__last_name__icontains=q)
-            | Q(player2__first_name__icontains=q) | Q(player2__last_name__icontains=q)
+            | player_search.name_filter(q, "player1_id")
+            | player_search.name_filter(q, "player2_id")
         )
     if date_from:
         qs = qs.filter(date__gte=date_from)
@@ -0,0 +1,131 @@
+"""
+Каталог игроков: фильтры, keyset-пагинация и кэш счётчиков.
+
+Страницы идут по индексу (last_name, first_name, id): курсор — последняя
+показанная тройка, следующая страница — «строго после неё», без OFFSET,
+поэтому 1-я и 2000-я страницы стоят одинаково.
+
+Число найденных кэшируется по «подписи» фильтра (значения формы без
+крайних пробелов) и версии каталога; версия меняется при сохранении/удалении Player
+(players/signals.py), так что после правки счётчики просто пересчитаются.
+"""
+import base64
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from . import search
+from .forms import PlayerFilterForm
+from .models import Player
+
+ORDERING = ("last_name", "first_name", "id")
+VERSION_KEY = "players:directory:version"
+
+
+def page_size():
+    return getattr(settings, "PLAYERS_PAGE_SIZE", 24)
+
+
+def filter_players(params):
+    """GET-параметры -> (queryset, подпись фильтра)."""
+    queryset = Player.objects.all()
+    form = PlayerFilterForm(params or None)
+    signature = {}
+
+    if form.is_valid():
+        name = form.cleaned_data.get("name")
+        min_age = form.cleaned_data.get("min_age")
+        max_age = form.cleaned_data.get("max_age")
+        level = form.cleaned_data.get("level")
+        address = form.cleaned_data.get("address")
+
+        if name:
+            queryset = queryset.filter(search.name_filter(name))
+        if min_age:
+            queryset = queryset.filter(age__gte=min_age)
+        if max_age:
+            queryset = queryset.filter(age__lte=max_age)
+        if level:
+            queryset = queryset.filter(level=level)
+        if address:
+            queryset = queryset.filter(address__icontains=address)
+
+        # без lower(): icontains в SQLite не различает регистр только для ASCII,
+        # и «Алматы»/«алматы» дают разные выборки
+        signature = {
+            key: (value.strip() if isinstance(value, str) else value)
+            for key, value in form.cleaned_data.items() if value not in (None, "")
+        }
+
+    return queryset.order_by(*ORDERING), signature
+
+
+# ===== Курсор =====
+
+def encode_cursor(player):
+    raw = json.dumps([player.last_name, player.first_name, player.id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Курсор -> (last_name, first_name, id) или None, если он битый."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_name, first_name, player_id = json.loads(raw)
+        return str(last_name), str(first_name), int(player_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, limit=None):
+    """Страница после курсора: ``(players, next_cursor)``; next_cursor=None на последней."""
+    limit = limit or page_size()
+    after = decode_cursor(cursor)
+    if after is not None:
+        last_name, first_name, player_id = after
+        # last_name__gte даёт SQLite диапазон по индексу (seek), OR уточняет внутри него
+        queryset = queryset.filter(last_name__gte=last_name).filter(
+            Q(last_name__gt=last_name)
+            | Q(last_name=last_name, first_name__gt=first_name)
+            | Q(last_name=last_name, first_name=first_name, id__gt=player_id)
+        )
+    players = list(queryset[: limit + 1])
+    if len(players) > limit:
+        players = players[:limit]
+        return players, encode_cursor(players[-1])
+    return players, None
+
+
+# ===== Счётчики =====
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # ключ вытеснен — начинаем с нового числа, чтобы не совпасть со старыми счётчиками
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Каталог изменился — все закэшированные счётчики устарели."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def cached_count(queryset, signature):
+    digest = hashlib.sha1(json.dumps(signature, sort_keys=True, default=str).encode()).hexdigest()
+    key = f"players:directory:count:{_version()}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=getattr(settings, "PLAYERS_COUNT_TTL", 600))
+    return count
@@ -0,0 +1,126 @@
+"""
+Уменьшенные копии фото игроков и достижений (thumb, card, full) в WebP и JPEG.
+
+Оригинал остаётся как есть; копии лежат рядом в storage:
+``players_photos/derivatives/<имя оригинала>/<размер>.<webp|jpg>``.
+Что сгенерировано, записано в поле ``photo_variants`` модели::
+
+    {"source": "players_photos/abc.jpg",
+     "sizes": {"card": {"w": 480, "webp": "...", "jpg": "..."}, ...}}
+
+Если ``source`` не совпадает с текущим ``photo.name`` (фото заменили, копий ещё
+нет), шаблоны отдают оригинал — без проверок storage на каждый рендер.
+
+Генерация запускается после коммита сохранения (players/signals.py) в фоновом
+пуле потоков; для уже загруженных файлов — manage.py backfill_image_derivatives.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# наибольшая сторона, px
+SIZES = {"thumb": 96, "card": 480, "full": 1280}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "progressive": True, "optimize": True}),
+}
+
+_executor = None
+
+
+def derivative_name(name, size, ext):
+    folder, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return f"{folder}/derivatives/{stem}/{size}.{ext}"
+
+
+def is_ready(fieldfile):
+    """Копии сгенерированы для текущего файла поля."""
+    variants = getattr(fieldfile.instance, f"{fieldfile.field.name}_variants", None) or {}
+    return bool(fieldfile) and variants.get("source") == fieldfile.name
+
+
+def variants_of(fieldfile):
+    if not is_ready(fieldfile):
+        return {}
+    return getattr(fieldfile.instance, f"{fieldfile.field.name}_variants").get("sizes", {})
+
+
+def _encode(image, fmt, options):
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def generate(storage, name):
+    """Сгенерировать копии файла ``name``; -> словарь для ``*_variants``."""
+    with storage.open(name, "rb") as fh:
+        original = Image.open(fh)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    sizes = {}
+    for size, edge in SIZES.items():
+        image = original.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)  # только уменьшает
+        entry = {"w": image.width}
+        for ext, (fmt, options) in FORMATS.items():
+            target = derivative_name(name, size, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            entry[ext] = storage.save(target, ContentFile(_encode(image, fmt, options)))
+        sizes[size] = entry
+    return {"source": name, "sizes": sizes}
+
+
+def process(model, pk, field_name):
+    """Сгенерировать копии для объекта и записать их, если фото за это время не сменилось."""
+    obj = model.objects.filter(pk=pk).only("pk", field_name).first()
+    fieldfile = getattr(obj, field_name, None) if obj else None
+    if not fieldfile:
+        return None
+    variants = generate(fieldfile.storage, fieldfile.name)
+    # update() без сигналов: не трогаем индексы и версию каталога
+    model.objects.filter(pk=pk, **{field_name: fieldfile.name}).update(**{f"{field_name}_variants": variants})
+    return variants
+
+
+def _run(model, pk, field_name):
+    try:
+        process(model, pk, field_name)
+    except Exception:
+        logger.exception("Не удалось сгенерировать копии %s #%s", model.__name__, pk)
+
+
+def _run_in_thread(model, pk, field_name):
+    # у потока пула своё соединение с БД — закрываем, как после запроса
+    close_old_connections()
+    try:
+        _run(model, pk, field_name)
+    finally:
+        close_old_connections()
+
+
+def schedule(model, pk, field_name="photo"):
+    """Поставить генерацию в фоновый пул (или выполнить сразу, если IMAGE_DERIVATIVES_ASYNC=False)."""
+    global _executor
+    if not getattr(settings, "IMAGE_DERIVATIVES_ASYNC", True):
+        _run(model, pk, field_name)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_DERIVATIVES_WORKERS", 2), thread_name_prefix="images"
+        )
+    _executor.submit(_run_in_thread, model, pk, field_name)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from players import images
+from players.models import Achievement, Player
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует уменьшенные копии (thumb, card, full; WebP и JPEG) для уже загруженных "
+        "фото игроков и достижений, у которых их ещё нет. Выполняется синхронно, "
+        "по одному файлу; повторный запуск пропускает готовые."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="перегенерировать и готовые")
+        parser.add_argument("--limit", type=int, default=0, help="максимум файлов за запуск (0 — без ограничения)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        done = failed = 0
+        for model in (Player, Achievement):
+            for obj in model.objects.exclude(Q(photo="") | Q(photo__isnull=True)).only("pk", "photo", "photo_variants"):
+                if opts["limit"] and done + failed >= opts["limit"]:
+                    break
+                if images.is_ready(obj.photo) and not opts["force"]:
+                    continue
+                if opts["dry_run"]:
+                    self.stdout.write(f"{model.__name__} #{obj.pk}: {obj.photo.name}")
+                    done += 1
+                    continue
+                try:
+                    images.process(model, obj.pk, "photo")
+                    done += 1
+                except Exception as exc:  # битый или отсутствующий файл — не останавливаемся
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} #{obj.pk} ({obj.photo.name}): {exc}")
+
+        verb = "К обработке" if opts["dry_run"] else "Готово"
+        self.stdout.write(f"{verb}: {done}, ошибок: {failed}")
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0003_alter_achievement_options_alter_player_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='player_name_order_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+import re
+
+from django.db import migrations
+
+
+# FTS5-индекс имён игроков в латинице (players/search.py). Транслитерацию SQLite
+# не умеет, поэтому строки пишет Python: сигналы Player и заполнение ниже.
+# Транслитерация скопирована сюда, чтобы миграция не зависела от будущих правок модуля.
+CREATE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS players_player_fts USING fts5(
+        first_name,
+        last_name,
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+"""
+INSERT_SQL = "INSERT OR REPLACE INTO players_player_fts(rowid, first_name, last_name) VALUES (%s, %s, %s)"
+
+TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya", "і": "i", "ї": "yi", "є": "ye", "ґ": "g",
+}
+SIMPLE = dict(TRANSLIT, **{"х": "h", "й": "i", "ц": "c", "щ": "sch", "ю": "ju", "я": "ja", "ж": "j"})
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def name_variants(text):
+    words = []
+    for word in TOKEN_RE.findall((text or "").lower()):
+        for table in (TRANSLIT, SIMPLE):
+            variant = "".join(table.get(ch, ch) for ch in word)
+            for spelling in (variant, variant.replace("iya", "ia").replace("ija", "ia")):
+                if spelling and spelling not in words:
+                    words.append(spelling)
+    return " ".join(words)
+
+
+def create_fts(apps, schema_editor):
+    # только SQLite; на других БД поиск работает через icontains
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Player = apps.get_model("players", "Player")
+
+    schema_editor.execute(CREATE_SQL)
+    rows = Player.objects.values_list("id", "first_name", "last_name").iterator()
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            INSERT_SQL,
+            [(pid, name_variants(first), name_variants(last)) for pid, first, last in rows],
+        )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS players_player_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0004_player_name_order_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
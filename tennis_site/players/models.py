@@ -48,6 +48,8 @@ class Player(models.Model):
         blank=True,
         null=True,
     )
+    # уменьшенные копии фото (players/images.py)
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     phone_number = models.CharField("Телефон", max_length=20, blank=True, null=True)
     address = models.CharField("Адрес проживания", max_length=255, blank=True, null=True)
@@ -59,6 +61,10 @@ class Player(models.Model):
         verbose_name = "Игрок"
         verbose_name_plural = "Игроки"
         ordering = ["last_name", "first_name"]
+        indexes = [
+            # keyset-пагинация каталога (players/directory.py)
+            models.Index(fields=["last_name", "first_name", "id"], name="player_name_order_idx"),
+        ]
 
 
 # === 4. Модель Достижения ===
@@ -79,6 +85,7 @@ class Achievement(models.Model):
         blank=True,
         null=True,
     )
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.title} — {self.player.first_name} {self.player.last_name}"
@@ -0,0 +1,136 @@
+"""
+Поиск игроков по имени: каталог, поиск матчей и подсказки (typeahead).
+
+На SQLite — FTS5-таблица players_player_fts (миграция 0005): rowid = id игрока,
+колонки first_name/last_name хранят имя в латинице — транслитерацию по ГОСТ-подобной
+схеме и упрощённый вариант («Хабиб» -> «khabib habib», «Юлия» -> «yuliya yulia
+julija julia»). Каждое слово запроса раскрывается в те же варианты через OR,
+поэтому «Иванов», «ivanov» и «Ivan», «Юлия» и «Yulia», «Хабибуллина» и
+«Habibullina» находят одного и того же игрока; последнее слово ищется по префиксу. Таблица обновляется из сигналов Player
+(players/signals.py); bulk_create/update() её не трогают — для них есть rebuild().
+
+На других БД или без FTS5 — icontains по first_name/last_name, как раньше.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from tennis_site import fts
+
+FTS_TABLE = "players_player_fts"
+
+# основная транслитерация и упрощённые варианты для букв, которые пишут по-разному
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya", "і": "i", "ї": "yi", "є": "ye", "ґ": "g",
+}
+_SIMPLE = dict(_TRANSLIT, **{"х": "h", "й": "i", "ц": "c", "щ": "sch", "ю": "ju", "я": "ja", "ж": "j"})
+
+
+def fts_available():
+    return fts.table_available(FTS_TABLE)
+
+
+def transliterate(text, table=_TRANSLIT):
+    return "".join(table.get(ch, ch) for ch in (text or "").lower())
+
+
+def word_variants(word):
+    """Написания слова в латинице: ГОСТ, упрощённое и «-ия» -> «-ia» (Юлия -> Yulia)."""
+    variants = []
+    for variant in (transliterate(word), transliterate(word, _SIMPLE)):
+        for spelling in (variant, variant.replace("iya", "ia").replace("ija", "ia")):
+            if spelling and spelling not in variants:
+                variants.append(spelling)
+    return variants
+
+
+def name_variants(text):
+    """Строка для индекса: все написания каждого слова, без повторов."""
+    words = []
+    for word in fts.TOKEN_RE.findall((text or "").lower()):
+        words.extend(v for v in word_variants(word) if v not in words)
+    return " ".join(words)
+
+
+def fts_query(text):
+    """Ввод пользователя -> запрос FTS5: каждое слово — (вариант OR вариант), последнее — по префиксу."""
+    return fts.match_query(text, word_variants)
+
+
+# ===== Обновление индекса =====
+
+def index_rows(rows):
+    """rows — (id, first_name, last_name); вставить/заменить строки индекса."""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, first_name, last_name) VALUES (%s, %s, %s)",
+            [(pid, name_variants(first), name_variants(last)) for pid, first, last in rows],
+        )
+
+
+def index_player(player):
+    if fts_available():
+        index_rows([(player.pk, player.first_name, player.last_name)])
+
+
+def remove_player(player_id):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [player_id])
+
+
+def rebuild():
+    """Переиндексировать всех игроков (после bulk-импорта)."""
+    from .models import Player
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    index_rows(Player.objects.values_list("id", "first_name", "last_name").iterator())
+
+
+# ===== Запросы =====
+
+def _match_sql():
+    return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+
+
+def name_filter(query, field="id"):
+    """
+    Q для фильтра по имени игрока: ``field`` — поле с id игрока
+    (``"id"`` для Player, ``"player1_id"`` для Match и т.п.).
+    """
+    query = (query or "").strip()
+    if not query:
+        return Q()
+    if fts_available():
+        match = fts_query(query)
+        if not match:
+            return Q(**{f"{field}__in": []})
+        return Q(**{f"{field}__in": RawSQL(_match_sql(), [match])})
+    prefix = "" if field == "id" else field[: -len("_id")] + "__"
+    return Q(**{f"{prefix}first_name__icontains": query}) | Q(**{f"{prefix}last_name__icontains": query})
+
+
+def ranked_player_ids(query, limit=10):
+    """id игроков, лучшие совпадения первыми (bm25; фамилия весит больше имени)."""
+    from .models import Player
+
+    query = (query or "").strip()
+    if not query:
+        return []
+    if not fts_available():
+        return list(Player.objects.filter(name_filter(query)).values_list("id", flat=True)[:limit])
+    match = fts_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, 1.0, 2.0), rowid LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
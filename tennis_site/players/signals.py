@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Achievement, Player
+from . import directory, images, search
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def player_directory_changed(sender, instance, **kwargs):
+    # закэшированные счётчики каталога пересчитаются по новой версии
+    transaction.on_commit(directory.bump_version)
+
+
+@receiver(post_save, sender=Player)
+def player_search_index(sender, instance, update_fields=None, **kwargs):
+    # индекс имён (players/search.py) — та же транзакция, что и сохранение
+    if update_fields is None or {"first_name", "last_name"} & set(update_fields):
+        search.index_player(instance)
+
+
+@receiver(post_delete, sender=Player)
+def player_search_unindex(sender, instance, **kwargs):
+    search.remove_player(instance.pk)
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_save, sender=Achievement)
+def photo_derivatives(sender, instance, **kwargs):
+    # новое фото — копии thumb/card/full в фоне после коммита
+    if instance.photo and not images.is_ready(instance.photo):
+        pk = instance.pk
+        transaction.on_commit(lambda: images.schedule(sender, pk))
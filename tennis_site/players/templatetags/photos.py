@@ -0,0 +1,52 @@
+"""
+Фото в шаблонах с уменьшенными копиями (players/images.py)::
+
+    {% load photos %}
+    {% picture player.photo "card" sizes="(min-width: 992px) 33vw, 100vw" class="card-img-top" alt="" %}
+    <img src="{{ p.photo|photo_url:'thumb' }}" srcset="{{ p.photo|photo_srcset }}">
+
+Пока копий нет (только что загружено), отдаётся оригинал.
+"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from players import images
+
+register = template.Library()
+
+
+@register.filter
+def photo_url(fieldfile, size="card"):
+    """URL JPEG-копии размера ``size`` (или оригинала)."""
+    if not fieldfile:
+        return ""
+    entry = images.variants_of(fieldfile).get(size)
+    return fieldfile.storage.url(entry["jpg"]) if entry else fieldfile.url
+
+
+@register.filter
+def photo_srcset(fieldfile, ext="jpg"):
+    """``srcset`` по всем размерам в формате ``ext`` (jpg/webp); пусто, если копий нет."""
+    if not fieldfile:
+        return ""
+    variants = images.variants_of(fieldfile)
+    return ", ".join(
+        f"{fieldfile.storage.url(entry[ext])} {entry['w']}w"
+        for entry in sorted(variants.values(), key=lambda e: e["w"])
+    )
+
+
+@register.simple_tag
+def picture(fieldfile, size="card", sizes="100vw", **attrs):
+    """``<picture>`` с WebP и JPEG srcset; атрибуты (class, style, alt …) — для ``<img>``."""
+    attrs.setdefault("alt", "")
+    attrs.setdefault("loading", "lazy")
+    img_attrs = format_html_join("", ' {}="{}"', attrs.items())
+    src = photo_url(fieldfile, size)
+    if not images.is_ready(fieldfile):
+        return format_html('<img src="{}"{}>', src, img_attrs)
+    return format_html(
+        '<picture style="display:contents"><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        photo_srcset(fieldfile, "webp"), sizes, src, photo_srcset(fieldfile, "jpg"), sizes, img_attrs,
+    )
@@ -1,3 +1,56 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Player
+
+# запрос -> фамилии найденных игроков
+NAME_QUERIES = {
+    "Юлия": {"Иванова", "Ivanova"},
+    "Yulia": {"Иванова", "Ivanova"},
+    "Юлия Иванова": {"Иванова", "Ivanova"},
+    "Иванова Юлия": {"Иванова", "Ivanova"},
+    "Алексей Хабибуллин": {"Хабибуллин"},
+    "Habibullin": {"Хабибуллин"},
+    "Мария Щукина": {"Щукина"},
+    "Maria Shchukina": {"Щукина"},
+    "Dias Жумабаев": {"Жумабаев"},
+    "Хаби": {"Хабибуллин"},
+    "Мария Щук": {"Щукина"},
+    "Иван": {"Иванова", "Ivanova", "Петров"},
+    "ab'\"*": set(),
+}
+
+
+def make_players():
+    names = [
+        ("Юлия", "Иванова"), ("Yulia", "Ivanova"), ("Алексей", "Хабибуллин"),
+        ("Мария", "Щукина"), ("Диас", "Жумабаев"), ("Иван", "Петров"),
+    ]
+    return {
+        last: Player.objects.create(first_name=first, last_name=last, age=30, level="3.0")
+        for first, last in names
+    }
+
+
+class PlayerNameSearchTests(TestCase):
+    """Поиск по имени (FTS5 + транслитерация) через каталог и подсказки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.players = make_players()
+
+    def test_directory(self):
+        for query, expected in NAME_QUERIES.items():
+            with self.subTest(query=query):
+                response = self.client.get(reverse("players_list"), {"name": query})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual({p.last_name for p in response.context["players"]}, expected)
+                self.assertEqual(response.context["total_count"], len(expected))
+
+    def test_typeahead(self):
+        for query, expected in NAME_QUERIES.items():
+            with self.subTest(query=query):
+                response = self.client.get(reverse("player_typeahead"), {"q": query})
+                self.assertEqual(response.status_code, 200)
+                names = {r["name"].split()[-1] for r in response.json()["results"]}
+                self.assertEqual(names, expected)
@@ -9,6 +9,8 @@ urlpatterns = [
 
     # Список и CRUD игроков
     path("", views.PlayerListView.as_view(), name="players_list"),
+    path("page/", views.players_page, name="players_page"),
+    path("typeahead/", views.player_typeahead, name="player_typeahead"),
     path("add/", views.PlayerCreateView.as_view(), name="player_add"),
     path("<int:pk>/", views.PlayerDetailView.as_view(), name="player_detail"),
     path("<int:pk>/edit/", views.PlayerUpdateView.as_view(), name="player_edit"),
@@ -1,6 +1,8 @@
 # tennis_site/players/views.py
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -10,6 +12,7 @@ from django.core.files.uploadedfile import InMemoryUploadedFile
 import base64, uuid, re, io
 from PIL import Image
 
+from . import directory, search
 from .models import Player, Achievement
 from .forms import PlayerForm, AchievementForm, PlayerProfileForm, PlayerFilterForm
 
@@ -72,35 +75,45 @@ class PlayerListView(ListView):
     context_object_name = "players"
 
     def get_queryset(self):
-        queryset = Player.objects.all()
-        form = PlayerFilterForm(self.request.GET or None)
-
-        if form.is_valid():
-            name = form.cleaned_data.get("name")
-            min_age = form.cleaned_data.get("min_age")
-            max_age = form.cleaned_data.get("max_age")
-            level = form.cleaned_data.get("level")
-            address = form.cleaned_data.get("address")
-
-            if name:
-                queryset = queryset.filter(Q(first_name__icontains=name) | Q(last_name__icontains=name))
-            if min_age:
-                queryset = queryset.filter(age__gte=min_age)
-            if max_age:
-                queryset = queryset.filter(age__lte=max_age)
-            if level:
-                queryset = queryset.filter(level=level)
-            if address:
-                queryset = queryset.filter(address__icontains=address)
-
+        queryset, self.signature = directory.filter_players(self.request.GET)
         return queryset
 
     def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
+        # первая страница; следующие — через players_page по курсору
+        players, next_cursor = directory.keyset_page(self.object_list)
+        ctx = super().get_context_data(object_list=players, **kwargs)
         ctx["form"] = PlayerFilterForm(self.request.GET or None)
+        ctx["next_cursor"] = next_cursor
+        ctx["total_count"] = directory.cached_count(self.object_list, self.signature)
         return ctx
 
 
+def players_page(request):
+    """Следующая страница каталога для бесконечной прокрутки: HTML карточек + курсор."""
+    queryset, _ = directory.filter_players(request.GET)
+    players, next_cursor = directory.keyset_page(queryset, request.GET.get("cursor"))
+    html = render_to_string("players/_player_cards.html", {"players": players}, request=request)
+    return JsonResponse({"html": html, "next_cursor": next_cursor})
+
+
+def player_typeahead(request):
+    """Подсказки по имени (?q=): до 10 игроков, лучшие совпадения первыми."""
+    ids = search.ranked_player_ids(request.GET.get("q", ""), limit=10)
+    by_id = Player.objects.only("id", "first_name", "last_name", "photo").in_bulk(ids)
+    results = []
+    for pid in ids:
+        player = by_id.get(pid)
+        if player is None:
+            continue
+        results.append({
+            "id": player.id,
+            "name": f"{player.first_name} {player.last_name}".strip(),
+            "url": reverse("player_detail", args=[player.id]),
+            "photo": player.photo.url if player.photo else None,
+        })
+    return JsonResponse({"results": results})
+
+
 # ================================================================
 # Создание профиля игрока
 # ================================================================
@@ -59,6 +59,11 @@ if (window.userIsAuthenticated) { // см. ниже, как передать э
 
   notifSocket.onmessage = function(e) {
     const data = JSON.parse(e.data);
+    // один кадр на пачку: счётчик (если менялся) + события дружбы/матчей
+    if (data.events) {
+      document.dispatchEvent(new CustomEvent("site:notifications", { detail: data.events }));
+    }
+    if (data.unread_count === undefined) return;
     const badge = document.getElementById("chat-unread");
     if (badge) {
       if (data.unread_count > 0) {
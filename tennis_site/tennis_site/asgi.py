@@ -11,7 +11,6 @@ import os
 import django
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tennis_site.settings")
 django.setup()
@@ -19,10 +18,11 @@ django.setup()
 # ❌ НЕ импортируем chat.routing до django.setup()
 
 from chat import routing  # импорт только после django.setup()
+from chat.middleware import CachedAuthMiddlewareStack  # сессия -> user/player из кэша
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "websocket": CachedAuthMiddlewareStack(
         URLRouter(
             routing.websocket_urlpatterns
         )
@@ -0,0 +1,50 @@
+"""
+Общие помощники SQLite FTS5 для поиска игроков (players/search.py) и сообщений
+(chat/search.py).
+
+* ``table_available`` — есть ли FTS-таблица (проверяется один раз на процесс);
+* ``match_query`` — пользовательский ввод -> безопасный запрос MATCH: слова в
+  кавычках (операторы и спецсимволы FTS не интерпретируются), последнее — по
+  префиксу; если задан ``variants``, слово раскрывается в ``("a" OR "b")``.
+"""
+import re
+
+from django.db import connection
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_available = {}
+
+
+def table_available(table):
+    """Есть ли FTS-таблица ``table`` (проверяется один раз на процесс)."""
+    if table not in _available:
+        _available[table] = (
+            connection.vendor == "sqlite"
+            and table in connection.introspection.table_names()
+        )
+    return _available[table]
+
+
+def _group(variants, prefix):
+    star = "*" if prefix else ""
+    terms = [f'"{v}"{star}' for v in variants]
+    return terms[0] if len(terms) == 1 else "(" + " OR ".join(terms) + ")"
+
+
+def match_query(text, variants=None):
+    """
+    Ввод -> запрос FTS5. ``variants(word)`` — написания слова (список); без него
+    слово ищется как есть. Пустая строка — искать нечего.
+    """
+    groups = []
+    for token in TOKEN_RE.findall(text or ""):
+        options = variants(token) if variants else [token]
+        options = [v for v in options if v]
+        if options:
+            groups.append(options)
+    if not groups:
+        return ""
+    last = len(groups) - 1
+    # AND явно: FTS5 не принимает неявный AND рядом со скобочной группой
+    return " AND ".join(_group(options, i == last) for i, options in enumerate(groups))
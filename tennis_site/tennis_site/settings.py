@@ -103,10 +103,36 @@ TEMPLATES = [
 
 # === ASGI и Channels ===
 ASGI_APPLICATION = "tennis_site.asgi.application"
-CHANNEL_LAYERS = {
-    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+
+# Redis для channel layer: CHANNEL_REDIS_URLS="redis://h1:6379/2,redis://h2:6379/2"
+# (несколько адресов = шардирование групп/каналов), иначе берём REDIS_URL.
+# Без Redis — in-memory слой: только один ASGI-воркер (для тестов/разработки).
+CHANNEL_REDIS_URLS = [
+    u.strip()
+    for u in os.getenv("CHANNEL_REDIS_URLS", os.getenv("REDIS_URL", "")).split(",")
+    if u.strip()
+]
+CHANNEL_LAYER_CONFIG = {
+    "capacity": int(os.getenv("CHANNEL_CAPACITY", "100")),          # сообщений в очереди канала
+    "expiry": int(os.getenv("CHANNEL_EXPIRY", "60")),               # сек. жизни сообщения
+    "group_expiry": int(os.getenv("CHANNEL_GROUP_EXPIRY", "86400")),  # сек. членства в группе
 }
 
+if CHANNEL_REDIS_URLS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "chat.layers.RedisChannelLayer",
+            "CONFIG": {"hosts": CHANNEL_REDIS_URLS, **CHANNEL_LAYER_CONFIG},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "chat.layers.InMemoryChannelLayer",
+            "CONFIG": CHANNEL_LAYER_CONFIG,
+        }
+    }
+
 # === База данных (SQLite — локально) ===
 DATABASES = {
     "default": {
@@ -194,6 +220,80 @@ REG_RATE_CACHE_ALIAS = os.getenv("REG_RATE_CACHE_ALIAS", "default")
 # Белый список IP (например для локального теста/CI)
 REG_RATE_WHITELIST = os.getenv("REG_RATE_WHITELIST", "127.0.0.1,::1").split(",")
 
+# --- Каталог игроков (players/directory.py): размер страницы и кэш счётчиков по фильтру, сек. ---
+PLAYERS_PAGE_SIZE = int(os.getenv("PLAYERS_PAGE_SIZE", "24"))
+PLAYERS_COUNT_TTL = int(os.getenv("PLAYERS_COUNT_TTL", "600"))
+
+# --- Уменьшенные копии фото (players/images.py): генерация в фоновом пуле потоков ---
+IMAGE_DERIVATIVES_ASYNC = os.getenv("IMAGE_DERIVATIVES_ASYNC", "True").lower() in ("1", "true", "yes")
+IMAGE_DERIVATIVES_WORKERS = int(os.getenv("IMAGE_DERIVATIVES_WORKERS", "2"))
+
+# --- Метрики чата (chat/metrics.py) ---
+CHAT_METRICS_CACHE_ALIAS = os.getenv("CHAT_METRICS_CACHE_ALIAS", "default")
+CHAT_METRICS_FLUSH_INTERVAL = float(os.getenv("CHAT_METRICS_FLUSH_INTERVAL", "5"))  # сек. между сбросами в кэш
+
+# --- Чат: кэш суммы непрочитанных (сек.); сама сумма ведётся инкрементально ---
+CHAT_UNREAD_CACHE_TTL = int(os.getenv("CHAT_UNREAD_CACHE_TTL", "600"))
+# --- Чат: кэш участников для проверки доступа (сбрасывается сигналами) ---
+CHAT_MEMBERS_CACHE_TTL = int(os.getenv("CHAT_MEMBERS_CACHE_TTL", "3600"))
+
+# --- Чат: кэш «карточек» отправителей (имя + URL аватара), сбрасывается при сохранении Player ---
+CHAT_SENDER_CACHE_TTL = int(os.getenv("CHAT_SENDER_CACHE_TTL", "86400"))
+
+# --- Чат: окно истории сообщений (keyset-пагинация по id) ---
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "50"))
+CHAT_MAX_PAGE_SIZE = int(os.getenv("CHAT_MAX_PAGE_SIZE", "100"))
+
+# --- Чат: кэш последних сообщений чата (chat/recent.py); размер больше страницы, чтобы знать has_more ---
+CHAT_RECENT_SIZE = int(os.getenv("CHAT_RECENT_SIZE", "101"))
+CHAT_RECENT_TTL = int(os.getenv("CHAT_RECENT_TTL", "3600"))
+# буфер верен только в общем кэше: по умолчанию (None) включён лишь с REDIS_URL
+_recent_buffer = os.getenv("CHAT_RECENT_BUFFER", "").strip().lower()
+CHAT_RECENT_BUFFER = (_recent_buffer in ("1", "true", "yes")) if _recent_buffer else None
+
+# --- Чат: поиск по сообщениям (/chat/api/search/, FTS5 на SQLite) ---
+CHAT_SEARCH_PAGE_SIZE = int(os.getenv("CHAT_SEARCH_PAGE_SIZE", "20"))
+
+# --- Чат: архив старых сообщений (manage.py archive_messages, запускать по cron) ---
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "180"))
+CHAT_ARCHIVE_BATCH = int(os.getenv("CHAT_ARCHIVE_BATCH", "500"))
+
+# --- Чат: досылка пропущенного при переподключении сокета (?last_seen_id=), максимум сообщений ---
+CHAT_REPLAY_MAX = int(os.getenv("CHAT_REPLAY_MAX", "200"))
+
+# --- Чат: Server-Sent Events (/chat/api/events/), интервал keepalive в секундах ---
+CHAT_EVENTS_KEEPALIVE = int(os.getenv("CHAT_EVENTS_KEEPALIVE", "25"))
+
+# --- Чат: присутствие (TTL онлайна в кэше, сек.) и троттлинг «печатает…» (сек.) ---
+CHAT_PRESENCE_TTL = int(os.getenv("CHAT_PRESENCE_TTL", "60"))
+CHAT_TYPING_THROTTLE = int(os.getenv("CHAT_TYPING_THROTTLE", "3"))
+
+# --- Чат: кэш сессия -> user/player для WebSocket-рукопожатия (chat/middleware.py), сек. ---
+CHAT_WS_AUTH_TTL = int(os.getenv("CHAT_WS_AUTH_TTL", "60"))
+
+# --- Чат: лимиты WebSocket (chat/throttle.py) ---
+CHAT_WS_FRAME_RATE = float(os.getenv("CHAT_WS_FRAME_RATE", "10"))          # кадров/сек. на соединение
+CHAT_WS_FRAME_BURST = int(os.getenv("CHAT_WS_FRAME_BURST", "20"))
+CHAT_WS_RATE_DROP_LIMIT = int(os.getenv("CHAT_WS_RATE_DROP_LIMIT", "20"))  # отброшенных кадров до отключения
+# лимит пользователя считается в каждом ASGI-воркере отдельно (N воркеров -> до N × RATE)
+CHAT_USER_MESSAGE_RATE = float(os.getenv("CHAT_USER_MESSAGE_RATE", "2"))   # сообщений/сек. на пользователя
+CHAT_USER_MESSAGE_BURST = int(os.getenv("CHAT_USER_MESSAGE_BURST", "10"))
+CHAT_MAX_MESSAGE_LENGTH = int(os.getenv("CHAT_MAX_MESSAGE_LENGTH", "4000"))  # символов
+CHAT_WS_MAX_FRAME_BYTES = int(os.getenv("CHAT_WS_MAX_FRAME_BYTES", "16384"))
+
+# --- Чат: подпротокол chat.msgpack.v1 (chat/wire.py) — события копятся в один бинарный кадр ---
+CHAT_WS_BATCH_WINDOW = float(os.getenv("CHAT_WS_BATCH_WINDOW", "0.02"))  # сек.
+CHAT_WS_BATCH_MAX = int(os.getenv("CHAT_WS_BATCH_MAX", "32"))            # событий в кадре
+
+# --- Чат: окно debounce уведомлений (сек.): пачка событий notify = один подсчёт и один кадр ---
+CHAT_NOTIFY_DEBOUNCE = float(os.getenv("CHAT_NOTIFY_DEBOUNCE", "0.3"))
+
+# --- Чат: write-behind сообщений из WebSocket (chat/writebehind.py), по умолчанию выключен ---
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "False").lower() in ("1", "true", "yes")
+CHAT_WRITE_BEHIND_INTERVAL = float(os.getenv("CHAT_WRITE_BEHIND_INTERVAL", "0.2"))    # сек. до сброса
+CHAT_WRITE_BEHIND_BATCH = int(os.getenv("CHAT_WRITE_BEHIND_BATCH", "50"))             # сброс по размеру
+CHAT_WRITE_BEHIND_MAX_PENDING = int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "500"))  # предел очереди
+
 # === Прочее (оставлено как в твоём файле) ===
 UNIVERSAL_API_KEY = os.getenv("UNIVERSAL_API_KEY", "super-secret-key-123")
 